@@ -16,10 +16,13 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
-from app.database import Base
+from app.database import Base, DATABASE_URL
 from app.models import User, Customer, Reminder  # Import models to register them
 target_metadata = Base.metadata
 
+# Use the same (environment-driven) database URL as the application
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
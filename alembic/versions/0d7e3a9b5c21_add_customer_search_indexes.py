@@ -0,0 +1,50 @@
+"""add customer search indexes
+
+Revision ID: 0d7e3a9b5c21
+Revises: f2b6d8a0c4e9
+Create Date: 2026-10-17 17:24:36.182054
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d7e3a9b5c21'
+down_revision: Union[str, Sequence[str], None] = 'f2b6d8a0c4e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Adding a stored generated column rewrites the customers table once
+    op.add_column('customers', sa.Column(
+        'phone_digits', sa.String(),
+        sa.Computed("regexp_replace(phone, '[^0-9]', '', 'g')", persisted=True),
+        nullable=True
+    ))
+
+    # CONCURRENTLY cannot run inside a transaction, but keeps the table writable
+    with op.get_context().autocommit_block():
+        op.create_index('ix_customers_name_trgm', 'customers', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+        op.create_index('ix_customers_notes_trgm', 'customers', ['notes'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'notes': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+        op.create_index('ix_customers_owner_id_phone_digits', 'customers', ['owner_id', 'phone_digits'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_customers_owner_id_phone_digits', table_name='customers', postgresql_concurrently=True)
+        op.drop_index('ix_customers_notes_trgm', table_name='customers', postgresql_concurrently=True)
+        op.drop_index('ix_customers_name_trgm', table_name='customers', postgresql_concurrently=True)
+    op.drop_column('customers', 'phone_digits')
+    # pg_trgm is left installed; other database objects may use it
@@ -0,0 +1,47 @@
+"""add hot query indexes
+
+Revision ID: 3f9a1c2d7b4e
+Revises: b0c3b7a76a8e
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b4e'
+down_revision: Union[str, Sequence[str], None] = 'b0c3b7a76a8e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction, but keeps the tables writable
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reminders_pending_send_time', 'reminders', ['send_time'], unique=False,
+                        postgresql_where=sa.text("status = 'pending'"), postgresql_concurrently=True)
+        op.create_index('ix_reminders_status_send_time', 'reminders', ['status', 'send_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_reminders_customer_id_send_time', 'reminders', ['customer_id', 'send_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_customers_owner_id_phone', 'customers', ['owner_id', 'phone'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_payments_owner_id_created_at', 'payments', ['owner_id', 'created_at'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_payments_customer_id', 'payments', ['customer_id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_payments_customer_id', table_name='payments', postgresql_concurrently=True)
+        op.drop_index('ix_payments_owner_id_created_at', table_name='payments', postgresql_concurrently=True)
+        op.drop_index('ix_customers_owner_id_phone', table_name='customers', postgresql_concurrently=True)
+        op.drop_index('ix_reminders_customer_id_send_time', table_name='reminders', postgresql_concurrently=True)
+        op.drop_index('ix_reminders_status_send_time', table_name='reminders', postgresql_concurrently=True)
+        op.drop_index('ix_reminders_pending_send_time', table_name='reminders', postgresql_concurrently=True)
@@ -0,0 +1,29 @@
+"""add user token version
+
+Revision ID: 5a2c7e9f1b34
+Revises: 0d7e3a9b5c21
+Create Date: 2026-10-17 18:02:47.519368
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a2c7e9f1b34'
+down_revision: Union[str, Sequence[str], None] = '0d7e3a9b5c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant server default is a metadata-only change, no table rewrite
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
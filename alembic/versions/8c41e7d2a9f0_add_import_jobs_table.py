@@ -0,0 +1,46 @@
+"""add import jobs table
+
+Revision ID: 8c41e7d2a9f0
+Revises: 3f9a1c2d7b4e
+Create Date: 2026-10-17 11:03:27.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e7d2a9f0'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('import_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('file_path', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('rows_processed', sa.Integer(), nullable=True),
+    sa.Column('rows_failed', sa.Integer(), nullable=True),
+    sa.Column('failed_rows', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_import_jobs_owner_id'), 'import_jobs', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_import_jobs_owner_id'), table_name='import_jobs')
+    op.drop_table('import_jobs')
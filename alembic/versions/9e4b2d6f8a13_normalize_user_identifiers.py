@@ -0,0 +1,71 @@
+"""normalize user identifiers
+
+Revision ID: 9e4b2d6f8a13
+Revises: 5a2c7e9f1b34
+Create Date: 2026-10-17 18:41:09.273615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b2d6f8a13'
+down_revision: Union[str, Sequence[str], None] = '5a2c7e9f1b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same rules as app.services.identifiers.normalize_phone, with the default
+# country code fixed at the one in use when this migration was written
+PHONE_E164_SQL = """
+    CASE
+        WHEN btrim(phone) LIKE '00%' THEN '+' || substr(digits, 3)
+        WHEN btrim(phone) LIKE '+%' THEN '+' || digits
+        WHEN length(ltrim(digits, '0')) <= 10 THEN '+91' || ltrim(digits, '0')
+        ELSE '+' || ltrim(digits, '0')
+    END
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lower-case emails. Where two accounts only differ by case, the oldest
+    # one is normalized and the others are left as they are (they can no
+    # longer log in by email and need merging by hand).
+    op.execute(sa.text("""
+        WITH candidates AS (
+            SELECT id, lower(btrim(email)) AS normalized FROM users
+            WHERE email <> lower(btrim(email))
+        ), winners AS (
+            SELECT DISTINCT ON (normalized) id, normalized FROM candidates c
+            WHERE NOT EXISTS (SELECT 1 FROM users o WHERE o.email = c.normalized)
+            ORDER BY normalized, id
+        )
+        UPDATE users SET email = winners.normalized FROM winners WHERE users.id = winners.id
+    """))
+
+    # E.164 phone numbers, with the same handling of collisions; numbers that
+    # don't normalize to a plausible E.164 number are left alone
+    op.execute(sa.text(f"""
+        WITH parsed AS (
+            SELECT id, phone, regexp_replace(phone, '[^0-9]', '', 'g') AS digits FROM users
+            WHERE phone IS NOT NULL
+        ), candidates AS (
+            SELECT id, phone, {PHONE_E164_SQL} AS normalized FROM parsed
+        ), winners AS (
+            SELECT DISTINCT ON (normalized) id, normalized FROM candidates c
+            WHERE phone <> normalized
+              AND length(normalized) BETWEEN 9 AND 16 AND normalized NOT LIKE '+0%'
+              AND NOT EXISTS (SELECT 1 FROM users o WHERE o.phone = c.normalized)
+            ORDER BY normalized, id
+        )
+        UPDATE users SET phone = winners.normalized FROM winners WHERE users.id = winners.id
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The original spellings are not kept; normalized values remain valid
+    pass
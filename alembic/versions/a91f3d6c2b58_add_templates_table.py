@@ -0,0 +1,56 @@
+"""add templates table
+
+Revision ID: a91f3d6c2b58
+Revises: e7a4c9b3f2d1
+Create Date: 2026-10-17 15:37:44.092163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91f3d6c2b58'
+down_revision: Union[str, Sequence[str], None] = 'e7a4c9b3f2d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('templates',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('variables', sa.JSON(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_templates_owner_id'), 'templates', ['owner_id'], unique=False)
+    # The templates that used to be hardcoded in the reminders routes, shared by all users
+    op.execute(sa.text("""
+        INSERT INTO templates (id, owner_id, name, content, description, variables, version, created_at, updated_at)
+        VALUES
+        ('appointment', NULL, 'Appointment Reminder',
+         'Hi {name}, this is a reminder for your appointment on {date} at {time}.',
+         'Use this template for appointment reminders', '["name", "date", "time"]', 1, now(), now()),
+        ('payment', NULL, 'Payment Reminder',
+         'Hi {name}, your payment of {amount} is due on {date}. Thank you!',
+         'Use this template for payment reminders', '["name", "amount", "date"]', 1, now(), now()),
+        ('follow_up', NULL, 'Follow-up Message',
+         'Hi {name}, just following up on our conversation about {topic}.',
+         'Use this template for follow-up messages', '["name", "topic"]', 1, now(), now())
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_templates_owner_id'), table_name='templates')
+    op.drop_table('templates')
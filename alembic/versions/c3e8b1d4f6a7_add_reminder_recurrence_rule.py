@@ -0,0 +1,30 @@
+"""add reminder recurrence rule
+
+Revision ID: c3e8b1d4f6a7
+Revises: a91f3d6c2b58
+Create Date: 2026-10-17 16:21:50.748319
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8b1d4f6a7'
+down_revision: Union[str, Sequence[str], None] = 'a91f3d6c2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing recurring reminders keep a NULL rule; the application derives
+    # one from frequency and send_time the next time they are sent.
+    op.add_column('reminders', sa.Column('recurrence_rule', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('reminders', 'recurrence_rule')
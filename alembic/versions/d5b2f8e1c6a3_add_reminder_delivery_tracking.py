@@ -0,0 +1,32 @@
+"""add reminder delivery tracking
+
+Revision ID: d5b2f8e1c6a3
+Revises: 8c41e7d2a9f0
+Create Date: 2026-10-17 13:40:12.557031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b2f8e1c6a3'
+down_revision: Union[str, Sequence[str], None] = '8c41e7d2a9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reminders', sa.Column('message_sid', sa.String(), nullable=True))
+    op.add_column('reminders', sa.Column('error_code', sa.String(), nullable=True))
+    op.create_index(op.f('ix_reminders_message_sid'), 'reminders', ['message_sid'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reminders_message_sid'), table_name='reminders')
+    op.drop_column('reminders', 'error_code')
+    op.drop_column('reminders', 'message_sid')
@@ -0,0 +1,32 @@
+"""add customer keyset index
+
+Revision ID: f2b6d8a0c4e9
+Revises: c3e8b1d4f6a7
+Create Date: 2026-10-17 16:58:13.604927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8a0c4e9'
+down_revision: Union[str, Sequence[str], None] = 'c3e8b1d4f6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction, but keeps the table writable
+    with op.get_context().autocommit_block():
+        op.create_index('ix_customers_owner_id_created_at_id', 'customers', ['owner_id', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_customers_owner_id_created_at_id', table_name='customers', postgresql_concurrently=True)
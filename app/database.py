@@ -1,18 +1,145 @@
-from sqlalchemy import create_engine
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://saquibn:@localhost/greentick")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+asyncpg://")
+)
+
+# Connection pool configuration (per engine, per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# PgBouncer (transaction pooling) mode: PgBouncer owns the pool, so every
+# checkout opens a client connection to it and server-side prepared statements
+# are disabled. PgBouncer rejects startup parameters, so set statement_timeout
+# on the database role instead of DB_STATEMENT_TIMEOUT_MS.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+class PoolMetrics:
+    """Checkout wait time and timeout counters for a connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self, pool: Pool) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+class _TimedCheckoutMixin:
+    """Records how long each checkout waited for a free connection"""
 
-DATABASE_URL = "postgresql+psycopg2://saquibn:@localhost/greentick"
+    metrics: PoolMetrics
 
-engine = create_engine(DATABASE_URL)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics = PoolMetrics()
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+def _engine_options(is_async: bool) -> Dict[str, Any]:
+    """Build create_engine keyword arguments from the pool configuration"""
+    if DB_PGBOUNCER:
+        options = {"poolclass": NullPool}
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+# Synchronous engine for Celery tasks, the scheduler process and scripts
+engine = create_engine(DATABASE_URL, **_engine_options(is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the FastAPI routes, so DB round trips don't block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(is_async=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-# Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Pool metrics of both engines in this process"""
+    if DB_PGBOUNCER:
+        return {"mode": "pgbouncer"}
+    return {
+        "mode": "pool",
+        "sync": InstrumentedQueuePool.metrics.snapshot(engine.pool),
+        "async": InstrumentedAsyncQueuePool.metrics.snapshot(async_engine.sync_engine.pool),
+    }
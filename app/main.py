@@ -1,12 +1,24 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.database import get_pool_metrics
+from app.pagination import NEXT_CURSOR_HEADER
+from app.services.cache import get_cache_stats
+from app.services import razorpay_service
 from app.routes import auth, customers, reminders, payments
 
-app = FastAPI(title="GreenTick")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the pooled Razorpay connections
+    await razorpay_service.api.close()
+
+app = FastAPI(title="GreenTick", lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -15,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[NEXT_CURSOR_HEADER],  # Keyset pagination cursor
 )
 
 # Mount static files (CSS, JS)
@@ -33,3 +46,16 @@ app.include_router(payments.router, prefix="/payments", tags=["Payments"])
 async def read_root(request: Request):
     """Serve the main HTML frontend."""
     return templates.TemplateResponse("index.html", {"request": request})
+
+@app.get("/metrics/db-pool", tags=["Metrics"])
+async def read_db_pool_metrics():
+    """Connection pool size, in-use count and checkout wait time for this worker."""
+    return get_pool_metrics()
+
+@app.get("/metrics/cache", tags=["Metrics"])
+async def read_cache_metrics():
+    """Response cache hits, misses and hit ratio per namespace, across all workers."""
+    stats = await get_cache_stats()
+    if stats is None:
+        raise HTTPException(status_code=503, detail="Cache stats unavailable: Redis is not reachable")
+    return stats
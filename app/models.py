@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, JSON
+from sqlalchemy import Column, Computed, Integer, String, Boolean, Date, DateTime, ForeignKey, Float, Text, JSON, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 import datetime
@@ -10,11 +10,30 @@ class ReminderFrequency(PyEnum):
     WEEKLY = "weekly"
     MONTHLY = "monthly"
 
+class ReminderStatus(PyEnum):
+    PENDING = "pending"  # Scheduled, not yet due
+    QUEUED = "queued"  # Claimed for sending
+    SENT = "sent"  # Accepted by Twilio
+    DELIVERED = "delivered"
+    READ = "read"
+    FAILED = "failed"
+
 class PaymentStatus(PyEnum):
     PENDING = "pending"
     COMPLETED = "completed"
     FAILED = "failed"
 
+class WebhookEventStatus(PyEnum):
+    PENDING = "pending"  # Stored, not yet applied
+    PROCESSED = "processed"
+    FAILED = "failed"  # Could not be applied; see error
+
+class ImportJobStatus(PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -22,6 +41,8 @@ class User(Base):
     phone = Column(String, unique=True, index=True, nullable=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # Carried in access tokens as "tv"; incrementing it revokes every token issued so far
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Business profile fields
     business_name = Column(String, nullable=True)
@@ -39,6 +60,8 @@ class Customer(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     phone = Column(String)
+    # Digits only ("+91 98765-43210" -> "919876543210"), for phone-prefix search
+    phone_digits = Column(String, Computed("regexp_replace(phone, '[^0-9]', '', 'g')", persisted=True))
     notes = Column(Text, nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
     
@@ -49,25 +72,52 @@ class Customer(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # Tenant listing and the bulk-import duplicate phone check
+        Index("ix_customers_owner_id_phone", "owner_id", "phone"),
+        # Keyset pagination of the tenant's customers by (created_at, id)
+        Index("ix_customers_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        # Customer search: trigram substring matching (pg_trgm) and phone prefixes
+        Index("ix_customers_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_customers_notes_trgm", "notes", postgresql_using="gin", postgresql_ops={"notes": "gin_trgm_ops"}),
+        Index("ix_customers_owner_id_phone_digits", "owner_id", "phone_digits"),
+    )
+
 class Reminder(Base):
     __tablename__ = "reminders"
     id = Column(Integer, primary_key=True, index=True)
     message = Column(String)
     send_time = Column(DateTime, default=datetime.datetime.utcnow)
     customer_id = Column(Integer, ForeignKey("customers.id"))
-    status = Column(String, default="pending")
+    status = Column(String, default=ReminderStatus.PENDING.value)
+    
+    # Delivery tracking, filled in from the Twilio send result and status callbacks
+    message_sid = Column(String, nullable=True, unique=True, index=True)
+    error_code = Column(String, nullable=True)
     
     # New fields for enhanced reminders
     template_id = Column(String, nullable=True)  # For template-based messages
     template_variables = Column(JSON, nullable=True)  # Store variables for templates
     frequency = Column(String, default=ReminderFrequency.ONE_TIME.value)
     recurring_end_date = Column(DateTime, nullable=True)  # End date for recurring reminders
+    # DTSTART + RRULE text (see app.services.recurrence). A recurring reminder is a
+    # single row whose send_time is advanced to the next occurrence after each send.
+    recurrence_rule = Column(Text, nullable=True)
     
     # Relationships
     customer = relationship("Customer", back_populates="reminders")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # Due scan of the dispatcher and scheduler: only pending rows are indexed
+        Index("ix_reminders_pending_send_time", "send_time", postgresql_where=text("status = 'pending'")),
+        # Listing filtered by status
+        Index("ix_reminders_status_send_time", "status", "send_time"),
+        # Listing joined through the tenant's customers, ordered by send_time
+        Index("ix_reminders_customer_id_send_time", "customer_id", "send_time"),
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
     id = Column(Integer, primary_key=True, index=True)
@@ -87,3 +137,68 @@ class Payment(Base):
     owner = relationship("User", back_populates="payments")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        # Tenant listing ordered by created_at and the dashboard stats date range
+        Index("ix_payments_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_payments_customer_id", "customer_id"),
+    )
+
+class MessageTemplate(Base):
+    __tablename__ = "templates"
+    id = Column(String, primary_key=True)  # Slug for the built-in templates, UUID hex for the rest
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # NULL: available to everyone
+    name = Column(String)
+    content = Column(Text)
+    description = Column(String, nullable=True)
+    variables = Column(JSON, default=list)  # Extracted from content on every write
+    version = Column(Integer, default=1)  # Bumped on every content change; keys the compiled template cache
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class PaymentDailyRollup(Base):
+    """Per-owner, per-day, per-status payment totals, maintained with every payment write"""
+    __tablename__ = "payment_daily_rollups"
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC date of payments.created_at
+    status = Column(String, primary_key=True)
+    payment_count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0)
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    id = Column(String, primary_key=True)  # UUID hex, returned to the client as the job id
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    filename = Column(String)
+    file_path = Column(String)  # Uploaded file on the shared import directory
+    status = Column(String, default=ImportJobStatus.QUEUED.value)
+    
+    # Progress, updated by the import task after every chunk
+    rows_processed = Column(Integer, default=0)
+    rows_failed = Column(Integer, default=0)
+    failed_rows = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class WebhookEvent(Base):
+    """Inbox of received Razorpay webhooks, applied in batches by a Celery task"""
+    __tablename__ = "webhook_events"
+    id = Column(Integer, primary_key=True)
+    # Razorpay's X-Razorpay-Event-Id; redeliveries of an event are dropped by this unique key
+    event_id = Column(String, nullable=False, unique=True)
+    event = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default=WebhookEventStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claiming the oldest pending events
+        Index("ix_webhook_events_pending_id", "id", postgresql_where=text("status = 'pending'")),
+    )
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import BigInteger, DateTime, Select, tuple_
+
+from app.services.timestamps import naive_utc
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _cursor_value(column, value: Any) -> Any:
+    """A decoded cursor value as the column's Python type, so a forged cursor can't reach the database"""
+    if isinstance(column.type, DateTime):
+        return naive_utc(datetime.fromisoformat(value))
+    python_type = column.type.python_type
+    if python_type is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{column.key} must be an integer")
+        if not isinstance(column.type, BigInteger) and not -2 ** 31 <= value < 2 ** 31:
+            raise ValueError(f"{column.key} is out of range")
+        return value
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise ValueError(f"{column.key} must be a {python_type.__name__}")
+    return value
+
+class Keyset:
+    """
+    Keyset (seek) pagination over a unique sort key, e.g. (created_at, id)
+
+    Instead of OFFSET, the next page continues after the last row of the
+    previous one with a row-value comparison, so every page is an index range
+    scan of `limit` rows no matter how deep it is. Cursors are opaque to
+    clients: URL-safe base64 of the last row's sort key as JSON.
+    """
+
+    def __init__(self, *columns, descending: bool = False):
+        self.columns = columns
+        self.descending = descending
+
+    def _encode(self, row: Any) -> str:
+        values = []
+        for column in self.columns:
+            value = getattr(row, column.key)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    def _decode(self, cursor: str) -> List[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.columns):
+                raise ValueError("wrong number of values")
+            return [_cursor_value(column, value) for column, value in zip(self.columns, values)]
+        except (ValueError, TypeError, binascii.Error):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def apply(self, query: Select, cursor: Optional[str], limit: int, skip: int = 0) -> Select:
+        """
+        Order the query by the key and fetch one page (plus one row to detect a next page)
+
+        With a cursor the page starts right after it; otherwise skip is
+        applied as an OFFSET, for clients that still page that way.
+        """
+        order = [column.desc() if self.descending else column for column in self.columns]
+        query = query.order_by(*order)
+        if cursor:
+            key = tuple_(*self.columns)
+            values = tuple_(*self._decode(cursor))
+            query = query.where(key < values if self.descending else key > values)
+        elif skip:
+            query = query.offset(skip)
+        return query.limit(limit + 1)
+
+    def page(self, rows: Sequence[Any], limit: int, response: Response) -> List[Any]:
+        """Trim the look-ahead row and publish the next page's cursor in a response header"""
+        rows = list(rows)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = self._encode(rows[-1])
+        return rows
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import User
+from app.services.identifiers import login_identifier, normalize_email, normalize_phone
+from app.services.password_hashing import hash_password, verify_password
+from app.services.principal_cache import get_principal, invalidate_principal
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, Union
 from datetime import datetime, timedelta
 import jwt
 import jwt.exceptions as jwt_exceptions
-from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
 
@@ -20,9 +24,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-jwt-please-change-in-p
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
@@ -37,6 +38,17 @@ class UserCreate(UserBase):
     password: str
     business_name: Optional[str] = None
     business_whatsapp: Optional[str] = None
+    
+    # Stored normalized, so logins and uniqueness checks are exact index lookups
+    @validator('email')
+    def validate_email(cls, v):
+        return normalize_email(v)
+    
+    @validator('phone')
+    def validate_phone(cls, v):
+        if v is None or not v.strip():
+            return None
+        return normalize_phone(v)
 
 class BusinessProfileUpdate(BaseModel):
     business_name: str
@@ -63,12 +75,6 @@ class TokenData(BaseModel):
     user_id: Optional[int] = None
 
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -79,7 +85,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def create_user_token(user: User) -> str:
+    """Access token for a user, tagged with their current token version"""
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return create_access_token(
+        data={"sub": user.email, "user_id": user.id, "tv": user.token_version or 0},
+        expires_delta=access_token_expires
+    )
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """
+    The authenticated user, resolved through the principal cache
+
+    The returned User is detached from the session (see principal_cache).
+    Tokens are rejected once the account is deactivated or the user's
+    token_version has moved past the token's "tv" claim; tokens issued
+    before the claim existed count as version 0.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -94,33 +116,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(email=email, user_id=user_id)
     except jwt_exceptions.PyJWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.id == token_data.user_id).first()
-    if user is None:
+    user = await get_principal(db, token_data.user_id)
+    if user is None or not user.is_active or payload.get("tv", 0) != (user.token_version or 0):
         raise credentials_exception
     return user
 
 # Routes
 @router.post("/signup", response_model=Token, status_code=status.HTTP_201_CREATED)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user with email already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Check if user with phone already exists (if provided)
-    if user.phone:
-        db_user_phone = db.query(User).filter(User.phone == user.phone).first()
-        if db_user_phone:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Phone number already registered"
-            )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # Hashed on the bounded password hashing pool, off the event loop
+    hashed_password = await hash_password(user.password)
     db_user = User(
         email=user.email,
         phone=user.phone,
@@ -129,16 +134,22 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         business_whatsapp=user.business_whatsapp
     )
     
+    # The unique indexes on email and phone decide duplicates, so two
+    # concurrent signups can't both succeed
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        detail = "Phone number already registered" if "ix_users_phone" in str(e.orig) else "Email already registered"
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    await db.refresh(db_user)
     
     # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": db_user.email, "user_id": db_user.id},
-        expires_delta=access_token_expires
-    )
+    access_token = create_user_token(db_user)
     
     return {
         "access_token": access_token,
@@ -147,26 +158,36 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    # Try to find user by email
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # Find the user by normalized email or E.164 phone number, in one indexed lookup
+    kind, identifier = login_identifier(form_data.username)
+    column = User.phone if kind == "phone" else User.email
+    user = await db.scalar(select(User).where(column == identifier))
     
-    # If not found by email, try phone number
-    if not user:
-        user = db.query(User).filter(User.phone == form_data.username).first()
+    # bcrypt runs on the bounded password hashing pool, off the event loop
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await verify_password(form_data.password, user.hashed_password)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email/phone or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "user_id": user.id},
-        expires_delta=access_token_expires
-    )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
+        )
+    
+    # Re-hash with the current bcrypt cost if it has changed since the password was set
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    access_token = create_user_token(user)
     
     return {
         "access_token": access_token,
@@ -182,16 +203,33 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 async def update_business_profile(
     profile: BusinessProfileUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # The authenticated user is a cached, detached copy; update the row itself
+    user = await db.get(User, current_user.id)
+    
     # Update business profile fields
-    current_user.business_name = profile.business_name
-    current_user.business_whatsapp = profile.business_whatsapp
+    user.business_name = profile.business_name
+    user.business_whatsapp = profile.business_whatsapp
     
     if profile.business_logo:
-        current_user.business_logo = profile.business_logo
+        user.business_logo = profile.business_logo
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_principal(user.id)
     
-    return current_user
+    return user
+
+@router.post("/deactivate", status_code=status.HTTP_204_NO_CONTENT)
+async def deactivate_account(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Deactivate the current user's account and revoke all of their tokens"""
+    user = await db.get(User, current_user.id, with_for_update=True)
+    user.is_active = False
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    await invalidate_principal(user.id)
+    return None
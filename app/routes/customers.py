@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Customer, User
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models import Customer, User, ImportJob, ImportJobStatus
 from app.routes.auth import get_current_user
+from app.pagination import Keyset
+from app.services.customer_search import customer_search_rank, search_customers
+from app.services.export import EXPORT_FORMAT_PATTERN, export_response
+from app.tasks import import_customers_task
 from pydantic import BaseModel, Field
 from typing import Optional, List
-import csv
-import io
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import uuid
 
 router = APIRouter(tags=["Customers"])
 
+# Oldest first; id breaks ties between customers created in the same instant (e.g. one import)
+CUSTOMERS_KEYSET = Keyset(Customer.created_at, Customer.id)
+
+# Columns of GET /customers/export, in output order
+CUSTOMER_EXPORT_COLUMNS = [
+    Customer.id, Customer.name, Customer.phone, Customer.notes, Customer.created_at, Customer.updated_at,
+]
+
 class CustomerCreate(BaseModel):
     name: str
     phone: str
@@ -33,15 +50,45 @@ class CustomerResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class BulkImportResponse(BaseModel):
-    success_count: int
-    failed_count: int
-    failed_rows: List[dict] = []
+class ImportJobResponse(BaseModel):
+    id: str
+    filename: Optional[str] = None
+    status: str
+    rows_processed: int = 0
+    rows_failed: int = 0
+    throughput_rows_per_second: Optional[float] = None
+    error: Optional[str] = None
+    failed_rows: Optional[List[dict]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Directory shared by the API and the Celery workers for uploaded import files
+IMPORT_UPLOAD_DIR = os.getenv("IMPORT_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "greentick-imports"))
+
+# Helper functions
+def import_job_response(job: ImportJob) -> ImportJobResponse:
+    """Build an ImportJobResponse with the job's current throughput"""
+    response = ImportJobResponse.model_validate(job)
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            response.throughput_rows_per_second = round((job.rows_processed or 0) / elapsed, 2)
+    return response
+
+def save_upload(source, destination: str):
+    """Copy an uploaded file to disk in fixed-size blocks (blocking, call from a thread)"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with open(destination, "wb") as f:
+        shutil.copyfileobj(source, f, length=1024 * 1024)
 
 @router.post("/", response_model=CustomerResponse)
 async def create_customer(
     customer: CustomerCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     db_customer = Customer(
@@ -51,42 +98,101 @@ async def create_customer(
         owner_id=current_user.id
     )
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    await db.commit()
+    await db.refresh(db_customer)
     return db_customer
 
 @router.get("/", response_model=List[CustomerResponse])
 async def read_customers(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    sort: Optional[str] = Query(None, pattern="^relevance$"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Customer).filter(Customer.owner_id == current_user.id)
-    
-    # Add search functionality
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (Customer.name.ilike(search_term)) | 
-            (Customer.phone.ilike(search_term)) |
-            (Customer.notes.ilike(search_term))
-        )
+    """
+    List customers, optionally matching a search on name, notes or phone number
+
+    With sort=relevance, search results come best match first and page with
+    skip/limit; otherwise they are in creation order and page with cursors too.
+    """
+    query = select(Customer).where(Customer.owner_id == current_user.id)
+    
+    # Add search functionality (trigram indexes on name/notes, prefix index on phone digits)
+    query = search_customers(query, search)
+    
+    if sort == "relevance" and search:
+        if cursor:
+            raise HTTPException(status_code=400, detail="Relevance-sorted results page with skip/limit, not cursors")
+        query = query.order_by(customer_search_rank(search).desc(), Customer.id)
+        return (await db.scalars(query.offset(skip).limit(limit))).all()
     
-    customers = query.offset(skip).limit(limit).all()
-    return customers
+    # After the cursor if given, else skip/limit; the next cursor is in the X-Next-Cursor header
+    customers = (await db.scalars(CUSTOMERS_KEYSET.apply(query, cursor, limit, skip))).all()
+    return CUSTOMERS_KEYSET.page(customers, limit, response)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_customers(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    search: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream all of the user's customers (optionally matching a search) as CSV or NDJSON"""
+    query = select(*CUSTOMER_EXPORT_COLUMNS).where(Customer.owner_id == current_user.id)
+    query = search_customers(query, search)
+    return export_response(query.order_by(Customer.created_at, Customer.id), format, "customers")
+
+@router.get("/import-jobs", response_model=List[ImportJobResponse])
+async def read_import_jobs(
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the current user's most recent import jobs"""
+    jobs = (await db.scalars(
+        select(ImportJob)
+        .where(ImportJob.owner_id == current_user.id)
+        .order_by(ImportJob.created_at.desc())
+        .limit(limit)
+    )).all()
+    
+    responses = []
+    for job in jobs:
+        response = import_job_response(job)
+        response.failed_rows = None  # Only returned by the job detail endpoint
+        responses.append(response)
+    return responses
+
+@router.get("/import-jobs/{job_id}", response_model=ImportJobResponse)
+async def read_import_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Progress of an import job: rows processed, rows failed and throughput"""
+    job = await db.scalar(select(ImportJob).where(
+        ImportJob.id == job_id,
+        ImportJob.owner_id == current_user.id
+    ))
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    return import_job_response(job)
 
 @router.get("/{customer_id}", response_model=CustomerResponse)
 async def read_customer(
     customer_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    customer = db.query(Customer).filter(
+    customer = await db.scalar(select(Customer).where(
         Customer.id == customer_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -97,13 +203,13 @@ async def read_customer(
 async def update_customer(
     customer_id: int,
     customer_update: CustomerUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_customer = db.query(Customer).filter(
+    db_customer = await db.scalar(select(Customer).where(
         Customer.id == customer_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if db_customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -116,32 +222,32 @@ async def update_customer(
     if customer_update.notes is not None:
         db_customer.notes = customer_update.notes
     
-    db.commit()
-    db.refresh(db_customer)
+    await db.commit()
+    await db.refresh(db_customer)
     return db_customer
 
 @router.delete("/{customer_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_customer(
     customer_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_customer = db.query(Customer).filter(
+    db_customer = await db.scalar(select(Customer).where(
         Customer.id == customer_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if db_customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    db.delete(db_customer)
-    db.commit()
+    await db.delete(db_customer)
+    await db.commit()
     return None
 
-@router.post("/bulk-import", response_model=BulkImportResponse)
+@router.post("/bulk-import", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def bulk_import_customers(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check file type
@@ -151,66 +257,24 @@ async def bulk_import_customers(
             detail="Only CSV files are supported"
         )
     
-    # Process CSV file
-    contents = await file.read()
-    buffer = io.StringIO(contents.decode('utf-8'))
-    csv_reader = csv.DictReader(buffer)
-    
-    success_count = 0
-    failed_count = 0
-    failed_rows = []
-    
-    for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 to account for header row
-        try:
-            # Check required fields
-            if 'name' not in row or 'phone' not in row:
-                failed_rows.append({
-                    "row": row_num,
-                    "data": row,
-                    "error": "Missing required fields (name, phone)"
-                })
-                failed_count += 1
-                continue
-            
-            # Check if customer with same phone already exists
-            existing_customer = db.query(Customer).filter(
-                Customer.phone == row['phone'],
-                Customer.owner_id == current_user.id
-            ).first()
-            
-            if existing_customer:
-                failed_rows.append({
-                    "row": row_num,
-                    "data": row,
-                    "error": f"Customer with phone {row['phone']} already exists"
-                })
-                failed_count += 1
-                continue
-            
-            # Create new customer
-            notes = row.get('notes', None)
-            db_customer = Customer(
-                name=row['name'],
-                phone=row['phone'],
-                notes=notes,
-                owner_id=current_user.id
-            )
-            db.add(db_customer)
-            success_count += 1
-            
-        except Exception as e:
-            failed_rows.append({
-                "row": row_num,
-                "data": row,
-                "error": str(e)
-            })
-            failed_count += 1
-    
-    # Commit all successful additions
-    db.commit()
-    
-    return {
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "failed_rows": failed_rows
-    }
+    # Save the upload for the import worker and return the job at once
+    job_id = uuid.uuid4().hex
+    file_path = os.path.join(IMPORT_UPLOAD_DIR, f"{job_id}.csv")
+    await run_in_threadpool(save_upload, file.file, file_path)
+    
+    job = ImportJob(
+        id=job_id,
+        owner_id=current_user.id,
+        filename=file.filename,
+        file_path=file_path,
+        status=ImportJobStatus.QUEUED.value,
+        rows_processed=0,
+        rows_failed=0
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    
+    import_customers_task.delay(job_id)
+    
+    return import_job_response(job)
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Response, BackgroundTasks, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import Payment, Customer, User, PaymentStatus
 from app.routes.auth import get_current_user
-from app.services import razorpay_service, twilio_service
+from app.pagination import Keyset
+from app.services import cache, razorpay_service, twilio_service
+from app.services.cache import PAYMENT_STATS_CACHE
+from app.services.export import EXPORT_FORMAT_PATTERN, export_response
+from app.services.payment_rollups import rollup_entry, rollup_statements
+from app.services.payment_stats import load_payment_stats
+from app.services.timestamps import naive_utc
+from app.services.webhook_inbox import store_webhook_event, webhook_event_id
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -14,6 +22,16 @@ import uuid
 
 router = APIRouter(tags=["Payments"])
 
+# Newest first; id breaks ties between payments created in the same instant
+PAYMENTS_KEYSET = Keyset(Payment.created_at, Payment.id, descending=True)
+
+# Columns of GET /payments/export, in output order
+PAYMENT_EXPORT_COLUMNS = [
+    Payment.id, Payment.customer_id, Payment.amount, Payment.description, Payment.status,
+    Payment.payment_link, Payment.razorpay_payment_id, Payment.razorpay_order_id,
+    Payment.created_at, Payment.updated_at,
+]
+
 class PaymentCreate(BaseModel):
     amount: float = Field(..., gt=0)
     description: str
@@ -67,7 +85,12 @@ def send_payment_link_to_customer(customer_phone: str, payment_link: str, amount
     message = f"Hello! Here's your payment link for {description} (₹{amount}): {payment_link}"
     return twilio_service.send_whatsapp_message(customer_phone, message)
 
-def generate_invoice_pdf(payment: Payment, customer: Customer, db: Session):
+async def apply_rollup_change(db: AsyncSession, before, after):
+    """Move a payment's contribution in payment_daily_rollups, in the caller's transaction"""
+    for statement in rollup_statements(before, after):
+        await db.execute(statement)
+
+def generate_invoice_pdf(payment: Payment, customer: Customer, db: AsyncSession):
     """Generate invoice PDF for a payment"""
     # In a real implementation, you would generate a proper PDF with a library like ReportLab
     # For now, we'll just create a simple text-based invoice
@@ -89,18 +112,35 @@ def generate_invoice_pdf(payment: Payment, customer: Customer, db: Session):
     
     return invoice_content.encode('utf-8')
 
+def filter_payments(query, status: Optional[str], customer_id: Optional[int],
+                    from_date: Optional[datetime], to_date: Optional[datetime]):
+    """Apply the listing/export filters to a query over payments"""
+    if status:
+        query = query.where(Payment.status == status)
+    
+    if customer_id:
+        query = query.where(Payment.customer_id == customer_id)
+    
+    if from_date:
+        query = query.where(Payment.created_at >= naive_utc(from_date))
+    
+    if to_date:
+        query = query.where(Payment.created_at <= naive_utc(to_date))
+    
+    return query
+
 @router.post("/", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 async def create_payment(
     payment: PaymentCreate, 
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if customer exists and belongs to current user
-    customer = db.query(Customer).filter(
+    customer = await db.scalar(select(Customer).where(
         Customer.id == payment.customer_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -111,29 +151,36 @@ async def create_payment(
         description=payment.description,
         customer_id=payment.customer_id,
         owner_id=current_user.id,
-        status=PaymentStatus.PENDING.value
+        status=PaymentStatus.PENDING.value,
+        created_at=datetime.utcnow()
     )
     
     db.add(db_payment)
-    db.commit()
-    db.refresh(db_payment)
+    await apply_rollup_change(db, None, rollup_entry(db_payment))
+    await db.commit()
+    await cache.invalidate(PAYMENT_STATS_CACHE, current_user.id)
+    await db.refresh(db_payment)
     
     # Create payment link with Razorpay if requested
     if payment.send_payment_link:
         # Create Razorpay payment link
-        payment_link_response = razorpay_service.create_payment_link(
+        payment_link_response = await razorpay_service.create_payment_link_async(
             amount=payment.amount,
             customer_name=customer.name,
             customer_email="customer@example.com",  # In a real app, you'd have customer email
             customer_phone=customer.phone,
             description=payment.description,
-            callback_url=f"https://yourdomain.com/payments/callback/{db_payment.id}"
+            callback_url=f"https://yourdomain.com/payments/callback/{db_payment.id}",
+            reference_id=str(db_payment.id)
         )
         
         if "error" in payment_link_response:
             # If there's an error, we'll still keep the payment record but mark the error
+            before = rollup_entry(db_payment)
             db_payment.status = "error"
-            db.commit()
+            await apply_rollup_change(db, before, rollup_entry(db_payment))
+            await db.commit()
+            await cache.invalidate(PAYMENT_STATS_CACHE, current_user.id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create payment link: {payment_link_response['error']}"
@@ -142,8 +189,8 @@ async def create_payment(
         # Update payment record with payment link
         db_payment.payment_link = payment_link_response.get("short_url")
         db_payment.razorpay_order_id = payment_link_response.get("order_id")
-        db.commit()
-        db.refresh(db_payment)
+        await db.commit()
+        await db.refresh(db_payment)
         
         # Send payment link to customer via WhatsApp in background
         background_tasks.add_task(
@@ -158,47 +205,52 @@ async def create_payment(
 
 @router.get("/", response_model=List[PaymentResponse])
 async def read_payments(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     customer_id: Optional[int] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Start with base query for payments owned by current user
-    query = db.query(Payment).filter(Payment.owner_id == current_user.id)
-    
-    # Apply filters
-    if status:
-        query = query.filter(Payment.status == status)
-    
-    if customer_id:
-        query = query.filter(Payment.customer_id == customer_id)
-    
-    if from_date:
-        query = query.filter(Payment.created_at >= from_date)
-    
-    if to_date:
-        query = query.filter(Payment.created_at <= to_date)
+    query = select(Payment).where(Payment.owner_id == current_user.id)
+    query = filter_payments(query, status, customer_id, from_date, to_date)
     
-    # Get results with pagination
-    payments = query.order_by(Payment.created_at.desc()).offset(skip).limit(limit).all()
+    # Get results with pagination: after the cursor if given, else skip/limit.
+    # The next page's cursor is returned in the X-Next-Cursor header.
+    payments = (await db.scalars(PAYMENTS_KEYSET.apply(query, cursor, limit, skip))).all()
     
-    return payments
+    return PAYMENTS_KEYSET.page(payments, limit, response)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_payments(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream all of the user's payments matching the filters as CSV or NDJSON"""
+    query = select(*PAYMENT_EXPORT_COLUMNS).where(Payment.owner_id == current_user.id)
+    query = filter_payments(query, status, customer_id, from_date, to_date)
+    return export_response(query.order_by(Payment.created_at.desc(), Payment.id.desc()), format, "payments")
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
 async def read_payment(
     payment_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get payment and verify ownership
-    payment = db.query(Payment).filter(
+    payment = await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.owner_id == current_user.id
-    ).first()
+    ))
     
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -209,18 +261,20 @@ async def read_payment(
 async def update_payment(
     payment_id: int,
     payment_update: PaymentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get payment and verify ownership
-    payment = db.query(Payment).filter(
+    payment = await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.owner_id == current_user.id
-    ).first()
+    ).with_for_update())
     
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     
+    before = rollup_entry(payment)
+    
     # Update fields if provided
     if payment_update.status is not None:
         payment.status = payment_update.status
@@ -231,55 +285,61 @@ async def update_payment(
     if payment_update.razorpay_order_id is not None:
         payment.razorpay_order_id = payment_update.razorpay_order_id
     
-    db.commit()
-    db.refresh(payment)
+    await apply_rollup_change(db, before, rollup_entry(payment))
+    await db.commit()
+    await cache.invalidate(PAYMENT_STATS_CACHE, current_user.id)
+    await db.refresh(payment)
     
     return payment
 
 @router.delete("/{payment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_payment(
     payment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get payment and verify ownership
-    payment = db.query(Payment).filter(
+    payment = await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.owner_id == current_user.id
-    ).first()
+    ).with_for_update())
     
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    db.delete(payment)
-    db.commit()
+    await apply_rollup_change(db, rollup_entry(payment), None)
+    await db.delete(payment)
+    await db.commit()
+    await cache.invalidate(PAYMENT_STATS_CACHE, current_user.id)
     
     return None
 
 @router.post("/{payment_id}/send-link", response_model=PaymentLinkResponse)
 async def send_payment_link(
     payment_id: int,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get payment and verify ownership
-    payment = db.query(Payment).filter(
+    payment = await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.owner_id == current_user.id
-    ).first()
+    ))
     
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     # Get customer
-    customer = db.query(Customer).filter(Customer.id == payment.customer_id).first()
+    customer = await db.scalar(select(Customer).where(Customer.id == payment.customer_id))
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # If payment link already exists, resend it
     if payment.payment_link:
-        # Send existing payment link
-        result = send_payment_link_to_customer(
+        # Send existing payment link in background
+        background_tasks.add_task(
+            send_payment_link_to_customer,
             customer.phone,
             payment.payment_link,
             payment.amount,
@@ -297,13 +357,14 @@ async def send_payment_link(
         }
     
     # Create new payment link
-    payment_link_response = razorpay_service.create_payment_link(
+    payment_link_response = await razorpay_service.create_payment_link_async(
         amount=payment.amount,
         customer_name=customer.name,
         customer_email="customer@example.com",  # In a real app, you'd have customer email
         customer_phone=customer.phone,
         description=payment.description,
-        callback_url=f"https://yourdomain.com/payments/callback/{payment.id}"
+        callback_url=f"https://yourdomain.com/payments/callback/{payment.id}",
+        reference_id=str(payment.id)
     )
     
     if "error" in payment_link_response:
@@ -315,11 +376,12 @@ async def send_payment_link(
     # Update payment record with payment link
     payment.payment_link = payment_link_response.get("short_url")
     payment.razorpay_order_id = payment_link_response.get("order_id")
-    db.commit()
-    db.refresh(payment)
+    await db.commit()
+    await db.refresh(payment)
     
-    # Send payment link to customer
-    send_payment_link_to_customer(
+    # Send payment link to customer in background
+    background_tasks.add_task(
+        send_payment_link_to_customer,
         customer.phone,
         payment.payment_link,
         payment.amount,
@@ -339,20 +401,20 @@ async def send_payment_link(
 @router.get("/{payment_id}/invoice", response_class=StreamingResponse)
 async def get_invoice(
     payment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get payment and verify ownership
-    payment = db.query(Payment).filter(
+    payment = await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.owner_id == current_user.id
-    ).first()
+    ))
     
     if payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     # Get customer
-    customer = db.query(Customer).filter(Customer.id == payment.customer_id).first()
+    customer = await db.scalar(select(Customer).where(Customer.id == payment.customer_id))
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
@@ -368,83 +430,48 @@ async def get_invoice(
 
 @router.post("/webhook", status_code=status.HTTP_200_OK)
 async def razorpay_webhook(
-    webhook_data: Dict[str, Any],
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Handle Razorpay webhook events"""
+    """
+    Receive Razorpay webhook events
+    
+    Events are verified and stored in the webhook_events inbox, then
+    acknowledged right away; the process_webhook_events task applies them in
+    batches. Razorpay redelivers an event with the same id, which the inbox
+    ignores.
+    """
+    body = await request.body()
+    if not razorpay_service.verify_webhook_signature(body, request.headers.get("X-Razorpay-Signature")):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    
     try:
-        # Verify webhook signature (in a real app)
-        # signature = request.headers.get("X-Razorpay-Signature")
-        # is_valid = razorpay_service.verify_webhook_signature(json.dumps(webhook_data), signature)
-        # if not is_valid:
-        #     raise HTTPException(status_code=400, detail="Invalid webhook signature")
-        
-        # Process webhook event
-        event = webhook_data.get("event")
-        
-        if event == "payment_link.paid":
-            # Payment completed successfully
-            payload = webhook_data.get("payload", {}).get("payment_link", {})
-            reference_id = payload.get("reference_id")
-            payment_id = payload.get("razorpay_payment_id")
-            
-            if reference_id and reference_id.isdigit():
-                # Find the payment by reference_id
-                payment = db.query(Payment).filter(Payment.id == int(reference_id)).first()
-                
-                if payment:
-                    # Update payment status
-                    payment.status = PaymentStatus.COMPLETED.value
-                    payment.razorpay_payment_id = payment_id
-                    db.commit()
-                    
-                    # Get customer
-                    customer = db.query(Customer).filter(Customer.id == payment.customer_id).first()
-                    if customer:
-                        # Send confirmation message
-                        message = f"Thank you! Your payment of ₹{payment.amount} for {payment.description} has been received."
-                        twilio_service.send_whatsapp_message(customer.phone, message)
-        
-        return {"status": "success"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+        webhook_data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    if not isinstance(webhook_data, dict):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    event_id = webhook_event_id(request.headers.get("X-Razorpay-Event-Id"), body)
+    await db.execute(store_webhook_event(event_id, webhook_data))
+    await db.commit()
+    
+    return {"status": "success"}
 
 @router.get("/stats/summary")
 async def get_payment_stats(
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    bucket: Optional[str] = Query(None, pattern="^(day|month)$"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get payment statistics for dashboard"""
-    # Base query for user's payments
-    query = db.query(Payment).filter(Payment.owner_id == current_user.id)
-    
-    # Apply date filters if provided
-    if from_date:
-        query = query.filter(Payment.created_at >= from_date)
-    
-    if to_date:
-        query = query.filter(Payment.created_at <= to_date)
-    
-    # Get all relevant payments
-    payments = query.all()
-    
-    # Calculate statistics
-    total_payments = len(payments)
-    total_amount = sum(payment.amount for payment in payments)
-    completed_payments = sum(1 for payment in payments if payment.status == PaymentStatus.COMPLETED.value)
-    pending_payments = sum(1 for payment in payments if payment.status == PaymentStatus.PENDING.value)
-    failed_payments = sum(1 for payment in payments if payment.status == PaymentStatus.FAILED.value)
-    
-    # Calculate completion rate
-    completion_rate = (completed_payments / total_payments * 100) if total_payments > 0 else 0
-    
-    return {
-        "total_payments": total_payments,
-        "total_amount": total_amount,
-        "completed_payments": completed_payments,
-        "pending_payments": pending_payments,
-        "failed_payments": failed_payments,
-        "completion_rate": round(completion_rate, 2)
-    }
+    """Get payment statistics for dashboard, optionally with a per-day or per-month series"""
+    # Whole days are read from the daily rollups, so this is O(days) rather than O(payments);
+    # repeated dashboard loads between payment writes are served from the cache
+    return await cache.cached(
+        PAYMENT_STATS_CACHE,
+        current_user.id,
+        f"{from_date.isoformat() if from_date else ''}|{to_date.isoformat() if to_date else ''}|{bucket or ''}",
+        lambda: load_payment_stats(db, current_user.id, from_date, to_date, bucket)
+    )
@@ -1,20 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Form
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Reminder, Customer, User, ReminderFrequency
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Form, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Integer, JSON, Text, any_, bindparam, cast, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models import Reminder, Customer, User, ReminderFrequency, ReminderStatus, MessageTemplate
 from app.routes.auth import get_current_user
-from app.tasks import send_reminder_task
-from app.services.twilio_service import send_whatsapp_message
+from app.pagination import Keyset
+from app.tasks import send_reminder_task, dispatch_due_reminders
+from app.scheduler import notify_reminder_change, notify_reminders_reload
+from app.services.customer_search import search_customers
+from app.services.export import EXPORT_FORMAT_PATTERN, export_response
+from app.services.recurrence import build_rule, next_occurrence, occurrences, reminder_rule
+from app.services.timestamps import naive_utc
+from app.services.delivery_status import STATUS_CALLBACK_QUEUE, TWILIO_STATUS_CALLBACK_URL
+from app.services import cache
+from app.services.cache import TEMPLATES_CACHE
+from app.services.redis_service import get_async_redis
+from app.services.template_engine import TEMPLATE_PATTERN, render_template
+from app.services.template_store import forget_template, get_template, remember_template, visible_templates_query
+from app.services.twilio_service import send_whatsapp_message, TWILIO_AUTH_TOKEN
+from twilio.request_validator import RequestValidator
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime, timedelta
 import json
-import re
+import uuid
 
 router = APIRouter(tags=["Reminders"])
 
-# Template variable pattern: {variable_name}
-TEMPLATE_PATTERN = r'\{([a-zA-Z0-9_]+)\}'
+twilio_request_validator = RequestValidator(TWILIO_AUTH_TOKEN)
+
+# Soonest first; id breaks ties between reminders due at the same time
+REMINDERS_KEYSET = Keyset(Reminder.send_time, Reminder.id)
+
+# Columns of GET /reminders/export, in output order
+REMINDER_EXPORT_COLUMNS = [
+    Reminder.id, Reminder.customer_id, Reminder.message, Reminder.send_time, Reminder.status,
+    Reminder.frequency, Reminder.recurring_end_date, Reminder.recurrence_rule, Reminder.template_id,
+    Reminder.created_at, Reminder.updated_at,
+]
+
 
 class TemplateVariable(BaseModel):
     name: str
@@ -36,12 +62,60 @@ class ReminderCreate(BaseModel):
             raise ValueError(f"Frequency must be one of: {', '.join(valid_frequencies)}")
         return v
     
+    @validator('send_time', 'recurring_end_date')
+    def validate_utc(cls, v):
+        # Stored as naive UTC; asyncpg can't bind an aware datetime to these columns
+        return naive_utc(v)
+    
     @validator('recurring_end_date', always=True)
     def validate_recurring_end_date(cls, v, values):
         if values.get('frequency') != ReminderFrequency.ONE_TIME.value and v is None:
             raise ValueError("recurring_end_date is required for recurring reminders")
         return v
 
+class BulkReminderCreate(BaseModel):
+    template_id: str
+    send_time: datetime
+    # Recipients: explicit customer ids, or every customer matching customer_search
+    # (same matching as GET /customers/?search=; an empty string selects all customers)
+    customer_ids: Optional[List[int]] = None
+    customer_search: Optional[str] = None
+    # Variables shared by all messages, and per-customer overrides keyed by customer id.
+    # {name} and {phone} default to the customer's own.
+    template_variables: Optional[Dict[str, str]] = None
+    customer_variables: Optional[Dict[int, Dict[str, str]]] = None
+    frequency: str = ReminderFrequency.ONE_TIME.value
+    recurring_end_date: Optional[datetime] = None
+    
+    @validator('customer_search', always=True)
+    def validate_recipients(cls, v, values):
+        if (values.get('customer_ids') is None) == (v is None):
+            raise ValueError("Provide exactly one of customer_ids or customer_search")
+        return v
+    
+    @validator('frequency')
+    def validate_frequency(cls, v):
+        valid_frequencies = [freq.value for freq in ReminderFrequency]
+        if v not in valid_frequencies:
+            raise ValueError(f"Frequency must be one of: {', '.join(valid_frequencies)}")
+        return v
+    
+    @validator('send_time', 'recurring_end_date')
+    def validate_utc(cls, v):
+        # Stored as naive UTC; asyncpg can't bind an aware datetime to these columns
+        return naive_utc(v)
+    
+    @validator('recurring_end_date', always=True)
+    def validate_recurring_end_date(cls, v, values):
+        if values.get('frequency') != ReminderFrequency.ONE_TIME.value and v is None:
+            raise ValueError("recurring_end_date is required for recurring reminders")
+        return v
+
+class BulkReminderResponse(BaseModel):
+    created: int
+    template_id: str
+    send_time: datetime
+
 class ReminderUpdate(BaseModel):
     message: Optional[str] = None
     send_time: Optional[datetime] = None
@@ -49,6 +123,11 @@ class ReminderUpdate(BaseModel):
     recurring_end_date: Optional[datetime] = None
     template_variables: Optional[Dict[str, str]] = None
     status: Optional[str] = None
+    
+    @validator('send_time', 'recurring_end_date')
+    def validate_utc(cls, v):
+        # Stored as naive UTC; asyncpg can't bind an aware datetime to these columns
+        return naive_utc(v)
 
 class ReminderResponse(BaseModel):
     id: int
@@ -58,6 +137,7 @@ class ReminderResponse(BaseModel):
     status: str
     frequency: str
     recurring_end_date: Optional[datetime] = None
+    recurrence_rule: Optional[str] = None
     template_id: Optional[str] = None
     template_variables: Optional[Dict[str, str]] = None
     created_at: datetime
@@ -66,6 +146,12 @@ class ReminderResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class OccurrenceResponse(BaseModel):
+    reminder_id: int
+    customer_id: int
+    message: str
+    send_time: datetime
+
 class TemplateCreate(BaseModel):
     name: str
     content: str
@@ -74,7 +160,18 @@ class TemplateCreate(BaseModel):
     @validator('content')
     def validate_template_variables(cls, v):
         # Check if template has at least one variable
-        if not re.search(TEMPLATE_PATTERN, v):
+        if not TEMPLATE_PATTERN.search(v):
+            raise ValueError("Template must contain at least one variable in format {variable_name}")
+        return v
+
+class TemplateUpdate(BaseModel):
+    name: Optional[str] = None
+    content: Optional[str] = None
+    description: Optional[str] = None
+    
+    @validator('content')
+    def validate_template_variables(cls, v):
+        if v is not None and not TEMPLATE_PATTERN.search(v):
             raise ValueError("Template must contain at least one variable in format {variable_name}")
         return v
 
@@ -84,6 +181,8 @@ class TemplateResponse(BaseModel):
     content: str
     description: Optional[str] = None
     variables: List[str] = []
+    version: int = 1
+    is_default: bool = False
     
     class Config:
         from_attributes = True
@@ -91,62 +190,81 @@ class TemplateResponse(BaseModel):
 # Helper functions
 def extract_template_variables(template_content: str) -> List[str]:
     """Extract variable names from a template string"""
-    matches = re.findall(TEMPLATE_PATTERN, template_content)
+    matches = TEMPLATE_PATTERN.findall(template_content)
     return matches
 
-def apply_template(template_content: str, variables: Dict[str, str]) -> str:
-    """Apply variables to a template string"""
-    result = template_content
-    for var_name, var_value in variables.items():
-        result = result.replace(f"{{{var_name}}}", var_value)
-    return result
+def apply_template(template_content: str, variables: Dict[str, str], template_id: Optional[str] = None,
+                   version: int = 0) -> str:
+    """Apply variables to a template string, using the compiled template cache when the id is known"""
+    return render_template(template_content, variables, template_id, version)
+
+def template_response(template: MessageTemplate) -> Dict[str, Any]:
+    """Serialize a template, flagging the built-in ones shared by all users"""
+    response = TemplateResponse.model_validate(template).model_dump()
+    response["is_default"] = template.owner_id is None
+    return response
+
+async def load_templates(db: AsyncSession, owner_id: int) -> List[Dict[str, Any]]:
+    """Built-in templates followed by the user's own, by name"""
+    query = visible_templates_query(owner_id).order_by(
+        MessageTemplate.owner_id.is_not(None), MessageTemplate.name
+    )
+    return [template_response(template) for template in (await db.scalars(query)).all()]
+
+async def get_owned_template(db: AsyncSession, template_id: str, owner_id: int) -> MessageTemplate:
+    """Load one of the user's own templates for writing; built-in templates are read-only"""
+    template = await db.scalar(select(MessageTemplate).where(
+        MessageTemplate.id == template_id,
+        MessageTemplate.owner_id == owner_id
+    ).with_for_update())
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return template
 
-def schedule_next_recurring_reminder(reminder: Reminder, db: Session):
-    """Schedule the next occurrence of a recurring reminder"""
-    if reminder.frequency == ReminderFrequency.ONE_TIME.value:
+def advance_recurring_reminder(reminder: Reminder, now: datetime) -> Optional[datetime]:
+    """
+    Move a recurring reminder to its next occurrence after now
+    
+    Recurring reminders are a single row, so nothing is inserted. Returns the
+    new send_time, or None for one-time reminders and exhausted rules.
+    """
+    rule = reminder_rule(reminder.recurrence_rule, reminder.frequency, reminder.send_time, reminder.recurring_end_date)
+    next_time = next_occurrence(rule, max(reminder.send_time, now))
+    if next_time is None:
         return None
+    reminder.recurrence_rule = rule
+    reminder.send_time = next_time
+    return next_time
+
+def filter_reminders(query, status: Optional[str], customer_id: Optional[int],
+                     from_date: Optional[datetime], to_date: Optional[datetime]):
+    """Apply the listing/export filters to a query over reminders"""
+    if status:
+        query = query.where(Reminder.status == status)
     
-    # Calculate next send time based on frequency
-    next_send_time = None
-    if reminder.frequency == ReminderFrequency.DAILY.value:
-        next_send_time = reminder.send_time + timedelta(days=1)
-    elif reminder.frequency == ReminderFrequency.WEEKLY.value:
-        next_send_time = reminder.send_time + timedelta(weeks=1)
-    elif reminder.frequency == ReminderFrequency.MONTHLY.value:
-        # Simple approximation for monthly
-        next_send_time = reminder.send_time + timedelta(days=30)
-    
-    # Check if we've reached the end date
-    if next_send_time and reminder.recurring_end_date and next_send_time <= reminder.recurring_end_date:
-        # Create new reminder instance for next occurrence
-        new_reminder = Reminder(
-            message=reminder.message,
-            send_time=next_send_time,
-            customer_id=reminder.customer_id,
-            frequency=reminder.frequency,
-            recurring_end_date=reminder.recurring_end_date,
-            template_id=reminder.template_id,
-            template_variables=reminder.template_variables,
-            status="pending"
-        )
-        db.add(new_reminder)
-        db.commit()
-        return new_reminder
+    if customer_id:
+        query = query.where(Reminder.customer_id == customer_id)
     
-    return None
+    if from_date:
+        query = query.where(Reminder.send_time >= naive_utc(from_date))
+    
+    if to_date:
+        query = query.where(Reminder.send_time <= naive_utc(to_date))
+    
+    return query
 
 # Routes
 @router.post("/", response_model=ReminderResponse, status_code=status.HTTP_201_CREATED)
 async def create_reminder(
     reminder: ReminderCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if customer exists and belongs to current user
-    customer = db.query(Customer).filter(
+    customer = await db.scalar(select(Customer).where(
         Customer.id == reminder.customer_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -154,19 +272,14 @@ async def create_reminder(
     # Process template if template_id is provided
     final_message = reminder.message
     if reminder.template_id and reminder.template_variables:
-        # In a real app, you'd fetch the template from a database
-        # For now, we'll use a simple dictionary of predefined templates
-        templates = {
-            "appointment": "Hi {name}, this is a reminder for your appointment on {date} at {time}.",
-            "payment": "Hi {name}, your payment of {amount} is due on {date}. Thank you!",
-            "follow_up": "Hi {name}, just following up on our conversation about {topic}."
-        }
+        template = await get_template(db, reminder.template_id, current_user.id)
         
-        if reminder.template_id not in templates:
+        if template is None:
             raise HTTPException(status_code=404, detail="Template not found")
         
-        template_content = templates[reminder.template_id]
-        final_message = apply_template(template_content, reminder.template_variables)
+        final_message = apply_template(
+            template.content, reminder.template_variables, template.id, template.version
+        )
     
     # Create reminder
     db_reminder = Reminder(
@@ -175,77 +288,303 @@ async def create_reminder(
         customer_id=reminder.customer_id,
         frequency=reminder.frequency,
         recurring_end_date=reminder.recurring_end_date,
+        recurrence_rule=build_rule(reminder.frequency, reminder.send_time, reminder.recurring_end_date),
         template_id=reminder.template_id,
         template_variables=reminder.template_variables
     )
     
     db.add(db_reminder)
-    db.commit()
-    db.refresh(db_reminder)
+    await db.flush()
+    await notify_reminder_change(db, db_reminder)
+    await db.commit()
+    await db.refresh(db_reminder)
     
     return db_reminder
 
+@router.post("/bulk", response_model=BulkReminderResponse, status_code=status.HTTP_201_CREATED)
+async def create_reminders_bulk(
+    campaign: BulkReminderCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Schedule one templated reminder for each of many customers
+    
+    Ownership is checked with one query, messages are rendered from the
+    compiled template in one batch, and all reminders are inserted with a
+    single INSERT ... SELECT FROM unnest(...) statement in one transaction.
+    """
+    template = await get_template(db, campaign.template_id, current_user.id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    # One set query for the recipients, scoped to the current user
+    query = select(Customer.id, Customer.name, Customer.phone).where(Customer.owner_id == current_user.id)
+    if campaign.customer_ids is not None:
+        # A single array parameter, however many ids there are
+        query = query.where(Customer.id == any_(bindparam("customer_ids", campaign.customer_ids, type_=ARRAY(Integer))))
+    else:
+        query = search_customers(query, campaign.customer_search)
+    customers = (await db.execute(query.order_by(Customer.id))).all()
+    
+    if campaign.customer_ids is not None:
+        missing = set(campaign.customer_ids) - {customer.id for customer in customers}
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Customers not found: {sorted(missing)[:20]}" + (" ..." if len(missing) > 20 else "")
+            )
+    if not customers:
+        raise HTTPException(status_code=404, detail="No matching customers")
+    
+    shared_variables = campaign.template_variables or {}
+    customer_variables = campaign.customer_variables or {}
+    variables = [
+        {"name": customer.name, "phone": customer.phone, **shared_variables, **customer_variables.get(customer.id, {})}
+        for customer in customers
+    ]
+    messages = template.compiled().render_many(variables)
+    
+    now = datetime.utcnow()
+    rows = select(
+        func.unnest(literal(messages, ARRAY(Text))),
+        func.unnest(literal([customer.id for customer in customers], ARRAY(Integer))),
+        cast(func.unnest(literal([json.dumps(v) for v in variables], ARRAY(Text))), JSON),
+        literal(campaign.send_time),
+        literal(ReminderStatus.PENDING.value),
+        literal(campaign.frequency),
+        literal(campaign.recurring_end_date, Reminder.recurring_end_date.type),
+        literal(build_rule(campaign.frequency, campaign.send_time, campaign.recurring_end_date), Text),
+        literal(template.id),
+        literal(now),
+        literal(now),
+    )
+    await db.execute(insert(Reminder).from_select([
+        Reminder.message, Reminder.customer_id, Reminder.template_variables, Reminder.send_time,
+        Reminder.status, Reminder.frequency, Reminder.recurring_end_date, Reminder.recurrence_rule, Reminder.template_id,
+        Reminder.created_at, Reminder.updated_at
+    ], rows))
+    await notify_reminders_reload(db)
+    await db.commit()
+    
+    return {"created": len(customers), "template_id": template.id, "send_time": campaign.send_time}
+
 @router.get("/", response_model=List[ReminderResponse])
 async def read_reminders(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     customer_id: Optional[int] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Start with base query for reminders linked to customers owned by current user
-    query = db.query(Reminder).join(Customer).filter(Customer.owner_id == current_user.id)
+    query = select(Reminder).join(Customer).where(Customer.owner_id == current_user.id)
+    query = filter_reminders(query, status, customer_id, from_date, to_date)
     
-    # Apply filters
-    if status:
-        query = query.filter(Reminder.status == status)
+    # Get results with pagination: after the cursor if given, else skip/limit.
+    # The next page's cursor is returned in the X-Next-Cursor header.
+    reminders = (await db.scalars(REMINDERS_KEYSET.apply(query, cursor, limit, skip))).all()
     
-    if customer_id:
-        query = query.filter(Reminder.customer_id == customer_id)
+    return REMINDERS_KEYSET.page(reminders, limit, response)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_reminders(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream all of the user's reminders matching the filters as CSV or NDJSON"""
+    query = select(*REMINDER_EXPORT_COLUMNS).join(Customer).where(Customer.owner_id == current_user.id)
+    query = filter_reminders(query, status, customer_id, from_date, to_date)
+    return export_response(query.order_by(Reminder.send_time, Reminder.id), format, "reminders")
+
+@router.get("/occurrences", response_model=List[OccurrenceResponse])
+async def read_occurrences(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upcoming sends in a window (default: the next 30 days), with recurring reminders expanded
+    
+    Occurrences are computed from the stored rules; nothing is written.
+    """
+    from_date = naive_utc(from_date) or datetime.utcnow()
+    to_date = naive_utc(to_date) or from_date + timedelta(days=30)
+    
+    query = select(Reminder).join(Customer).where(
+        Customer.owner_id == current_user.id,
+        Reminder.status == ReminderStatus.PENDING.value,
+        Reminder.send_time <= to_date
+    )
     
-    if from_date:
-        query = query.filter(Reminder.send_time >= from_date)
+    result = []
+    for reminder in (await db.scalars(query)).all():
+        rule = reminder_rule(reminder.recurrence_rule, reminder.frequency, reminder.send_time, reminder.recurring_end_date)
+        if rule:
+            send_times = occurrences(rule, max(from_date, reminder.send_time), count=limit, end=to_date)
+        else:
+            send_times = [reminder.send_time] if reminder.send_time >= from_date else []
+        result.extend({
+            "reminder_id": reminder.id,
+            "customer_id": reminder.customer_id,
+            "message": reminder.message,
+            "send_time": send_time
+        } for send_time in send_times)
+    
+    result.sort(key=lambda occurrence: occurrence["send_time"])
+    return result[:limit]
+
+# Declared before /{reminder_id} so "templates" is not parsed as a reminder id
+@router.get("/templates", response_model=List[TemplateResponse])
+async def get_templates(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the built-in message templates and the user's own"""
+    return await cache.cached(TEMPLATES_CACHE, current_user.id, "all", lambda: load_templates(db, current_user.id))
+
+@router.post("/templates", response_model=TemplateResponse, status_code=status.HTTP_201_CREATED)
+async def create_template(
+    template: TemplateCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create a message template for the current user"""
+    db_template = MessageTemplate(
+        id=uuid.uuid4().hex,
+        owner_id=current_user.id,
+        name=template.name,
+        content=template.content,
+        description=template.description,
+        variables=extract_template_variables(template.content),
+        version=1
+    )
     
-    if to_date:
-        query = query.filter(Reminder.send_time <= to_date)
+    db.add(db_template)
+    await db.commit()
+    remember_template(db_template, await cache.invalidate(TEMPLATES_CACHE, current_user.id))
+    
+    return template_response(db_template)
+
+@router.get("/templates/{template_id}", response_model=TemplateResponse)
+async def read_template(
+    template_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = await db.scalar(visible_templates_query(current_user.id).where(MessageTemplate.id == template_id))
     
-    # Get results with pagination
-    reminders = query.order_by(Reminder.send_time).offset(skip).limit(limit).all()
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
     
-    return reminders
+    return template_response(template)
+
+@router.put("/templates/{template_id}", response_model=TemplateResponse)
+async def update_template(
+    template_id: str,
+    template_update: TemplateUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = await get_owned_template(db, template_id, current_user.id)
+    
+    # Update fields if provided
+    if template_update.name is not None:
+        template.name = template_update.name
+    
+    if template_update.description is not None:
+        template.description = template_update.description
+    
+    if template_update.content is not None and template_update.content != template.content:
+        template.content = template_update.content
+        template.variables = extract_template_variables(template_update.content)
+        template.version = (template.version or 1) + 1
+    
+    await db.commit()
+    await db.refresh(template)
+    remember_template(template, await cache.invalidate(TEMPLATES_CACHE, current_user.id))
+    
+    return template_response(template)
+
+@router.delete("/templates/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_template(
+    template_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = await get_owned_template(db, template_id, current_user.id)
+    
+    await db.delete(template)
+    await db.commit()
+    forget_template(template_id)
+    await cache.invalidate(TEMPLATES_CACHE, current_user.id)
+    
+    return None
 
 @router.get("/{reminder_id}", response_model=ReminderResponse)
 async def read_reminder(
     reminder_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get reminder and verify ownership
-    reminder = db.query(Reminder).join(Customer).filter(
+    reminder = await db.scalar(select(Reminder).join(Customer).where(
         Reminder.id == reminder_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if reminder is None:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
     return reminder
 
+@router.get("/{reminder_id}/occurrences", response_model=List[datetime])
+async def read_reminder_occurrences(
+    reminder_id: int,
+    count: int = Query(10, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Next send times of a reminder, starting with its current send_time"""
+    reminder = await db.scalar(select(Reminder).join(Customer).where(
+        Reminder.id == reminder_id,
+        Customer.owner_id == current_user.id
+    ))
+    
+    if reminder is None:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    
+    if reminder.status != ReminderStatus.PENDING.value:
+        return []
+    
+    rule = reminder_rule(reminder.recurrence_rule, reminder.frequency, reminder.send_time, reminder.recurring_end_date)
+    if rule is None:
+        return [reminder.send_time]
+    return occurrences(rule, reminder.send_time, count=count)
+
 @router.put("/{reminder_id}", response_model=ReminderResponse)
 async def update_reminder(
     reminder_id: int,
     reminder_update: ReminderUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get reminder and verify ownership
-    reminder = db.query(Reminder).join(Customer).filter(
+    reminder = await db.scalar(select(Reminder).join(Customer).where(
         Reminder.id == reminder_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if reminder is None:
         raise HTTPException(status_code=404, detail="Reminder not found")
@@ -263,79 +602,84 @@ async def update_reminder(
     if reminder_update.recurring_end_date is not None:
         reminder.recurring_end_date = reminder_update.recurring_end_date
     
+    # A new schedule restarts the rule from the (possibly new) send_time
+    if any(value is not None for value in (
+        reminder_update.send_time, reminder_update.frequency, reminder_update.recurring_end_date
+    )):
+        reminder.recurrence_rule = build_rule(reminder.frequency, reminder.send_time, reminder.recurring_end_date)
+    
     if reminder_update.template_variables is not None:
         reminder.template_variables = reminder_update.template_variables
         
         # If template variables changed and we have a template_id, update the message
         if reminder.template_id:
-            templates = {
-                "appointment": "Hi {name}, this is a reminder for your appointment on {date} at {time}.",
-                "payment": "Hi {name}, your payment of {amount} is due on {date}. Thank you!",
-                "follow_up": "Hi {name}, just following up on our conversation about {topic}."
-            }
+            template = await get_template(db, reminder.template_id, current_user.id)
             
-            if reminder.template_id in templates:
-                template_content = templates[reminder.template_id]
-                reminder.message = apply_template(template_content, reminder_update.template_variables)
+            if template is not None:
+                reminder.message = apply_template(
+                    template.content, reminder_update.template_variables, template.id, template.version
+                )
     
     if reminder_update.status is not None:
         reminder.status = reminder_update.status
     
-    db.commit()
-    db.refresh(reminder)
+    await notify_reminder_change(db, reminder)
+    await db.commit()
+    await db.refresh(reminder)
     
     return reminder
 
 @router.delete("/{reminder_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_reminder(
     reminder_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get reminder and verify ownership
-    reminder = db.query(Reminder).join(Customer).filter(
+    reminder = await db.scalar(select(Reminder).join(Customer).where(
         Reminder.id == reminder_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if reminder is None:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    db.delete(reminder)
-    db.commit()
+    await notify_reminder_change(db, reminder, deleted=True)
+    await db.delete(reminder)
+    await db.commit()
     
     return None
 
 @router.post("/{reminder_id}/send", status_code=status.HTTP_200_OK)
 async def send_reminder_now(
     reminder_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Send a reminder immediately via WhatsApp using Celery"""
     # Get reminder and verify ownership
-    reminder = db.query(Reminder).join(Customer).filter(
+    reminder = await db.scalar(select(Reminder).join(Customer).where(
         Reminder.id == reminder_id,
         Customer.owner_id == current_user.id
-    ).first()
+    ))
     
     if reminder is None:
         raise HTTPException(status_code=404, detail="Reminder not found")
 
     # Get customer details
-    customer = db.query(Customer).filter(Customer.id == reminder.customer_id).first()
+    customer = await db.scalar(select(Customer).where(Customer.id == reminder.customer_id))
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
 
     # Send WhatsApp message via Celery task
-    task_result = send_reminder_task.delay(customer.phone, reminder.message)
+    task_result = send_reminder_task.delay(customer.phone, reminder.message, reminder.id)
 
-    # Update reminder status
-    reminder.status = "sent"
-    db.commit()
-    
-    # If this is a recurring reminder, schedule the next one
-    next_reminder = schedule_next_recurring_reminder(reminder, db)
+    # A recurring reminder moves on to its next occurrence; otherwise it is done
+    next_send_time = advance_recurring_reminder(reminder, datetime.utcnow())
+    if next_send_time is None:
+        reminder.status = ReminderStatus.QUEUED.value
+    await notify_reminder_change(db, reminder)
+    await db.commit()
 
     response = {
         "message": "Reminder sent via WhatsApp",
@@ -344,102 +688,55 @@ async def send_reminder_now(
         "phone": customer.phone
     }
     
-    if next_reminder:
+    if next_send_time:
         response["next_reminder"] = {
-            "id": next_reminder.id,
-            "send_time": next_reminder.send_time
+            "id": reminder.id,
+            "send_time": next_send_time
         }
 
     return response
 
-@router.post("/send-pending", status_code=status.HTTP_200_OK)
+@router.post("/status-callback", status_code=status.HTTP_204_NO_CONTENT)
+async def twilio_status_callback(request: Request):
+    """
+    Twilio message status callback (delivered, read, failed, ...)
+
+    The callback is only verified and buffered in Redis here; the
+    ingest_delivery_statuses task applies buffered callbacks in bulk.
+    """
+    form = await request.form()
+    params = {key: value for key, value in form.items()}
+    
+    # Validate against the public URL Twilio signed, not the proxied one
+    url = str(request.url)
+    if TWILIO_STATUS_CALLBACK_URL:
+        url = f"{TWILIO_STATUS_CALLBACK_URL}?{request.url.query}" if request.url.query else TWILIO_STATUS_CALLBACK_URL
+    signature = request.headers.get("X-Twilio-Signature", "")
+    if not twilio_request_validator.validate(url, params, signature):
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+    
+    params["reminder_id"] = request.query_params.get("reminder_id")
+    await get_async_redis().lpush(STATUS_CALLBACK_QUEUE, json.dumps(params))
+    return None
+
+@router.post("/send-pending", status_code=status.HTTP_202_ACCEPTED)
 async def send_pending_reminders(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Send all pending reminders that are due via WhatsApp using Celery"""
-    now = datetime.utcnow()
-    
-    # Get all pending reminders for the current user's customers
-    pending_reminders = db.query(Reminder).join(Customer).filter(
-        Reminder.status == "pending",
-        Reminder.send_time <= now,
-        Customer.owner_id == current_user.id
-    ).all()
-
-    sent_reminders = []
-    next_reminders = []
-    
-    for reminder in pending_reminders:
-        customer = db.query(Customer).filter(Customer.id == reminder.customer_id).first()
-        if customer:
-            # Send WhatsApp message via Celery task
-            task_result = send_reminder_task.delay(customer.phone, reminder.message)
-
-            # Update reminder status
-            reminder.status = "sent"
-            db.commit()
-
-            sent_reminders.append({
-                "reminder_id": reminder.id,
-                "task_id": task_result.id,
-                "customer": customer.name,
-                "phone": customer.phone,
-                "message": reminder.message[:50] + "..." if len(reminder.message) > 50 else reminder.message
-            })
-            
-            # If this is a recurring reminder, schedule the next one
-            next_reminder = schedule_next_recurring_reminder(reminder, db)
-            if next_reminder:
-                next_reminders.append({
-                    "id": next_reminder.id,
-                    "send_time": next_reminder.send_time,
-                    "customer": customer.name
-                })
+    """Dispatch the current user's due reminders now instead of waiting for the next Celery Beat run"""
+    task_result = dispatch_due_reminders.delay(owner_id=current_user.id)
 
     return {
-        "message": f"Sent {len(sent_reminders)} pending reminders",
-        "sent_reminders": sent_reminders,
-        "next_reminders": next_reminders
+        "message": "Pending reminders queued for dispatch",
+        "task_id": task_result.id
     }
 
-@router.get("/templates", response_model=List[TemplateResponse])
-async def get_templates(
-    current_user: User = Depends(get_current_user)
-):
-    """Get predefined message templates"""
-    # In a real app, these would come from a database
-    # For now, we'll use hardcoded templates
-    templates = [
-        {
-            "id": "appointment",
-            "name": "Appointment Reminder",
-            "content": "Hi {name}, this is a reminder for your appointment on {date} at {time}.",
-            "description": "Use this template for appointment reminders",
-            "variables": ["name", "date", "time"]
-        },
-        {
-            "id": "payment",
-            "name": "Payment Reminder",
-            "content": "Hi {name}, your payment of {amount} is due on {date}. Thank you!",
-            "description": "Use this template for payment reminders",
-            "variables": ["name", "amount", "date"]
-        },
-        {
-            "id": "follow_up",
-            "name": "Follow-up Message",
-            "content": "Hi {name}, just following up on our conversation about {topic}.",
-            "description": "Use this template for follow-up messages",
-            "variables": ["name", "topic"]
-        }
-    ]
-    
-    return templates
-
 @router.post("/preview-template")
 async def preview_template(
     template_id: str = Form(...),
-    variables: str = Form(...)
+    variables: str = Form(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
 ):
     """Preview a template with provided variables"""
     try:
@@ -447,19 +744,13 @@ async def preview_template(
         vars_dict = json.loads(variables)
         
         # Get template
-        templates = {
-            "appointment": "Hi {name}, this is a reminder for your appointment on {date} at {time}.",
-            "payment": "Hi {name}, your payment of {amount} is due on {date}. Thank you!",
-            "follow_up": "Hi {name}, just following up on our conversation about {topic}."
-        }
+        template = await get_template(db, template_id, current_user.id)
         
-        if template_id not in templates:
+        if template is None:
             raise HTTPException(status_code=404, detail="Template not found")
         
-        template_content = templates[template_id]
-        
         # Apply variables to template
-        message = apply_template(template_content, vars_dict)
+        message = apply_template(template.content, vars_dict, template.id, template.version)
         
         return {"preview": message}
     except json.JSONDecodeError:
@@ -0,0 +1,222 @@
+"""
+Reminder Scheduler Process
+
+Keeps the next few minutes of pending reminders in an in-memory heap keyed
+by send_time and fires each one through send_reminder_task as soon as it is
+due. Reminder routes, and dispatches that advance a recurring reminder,
+publish changes with Postgres NOTIFY on the reminder_changes channel, and
+the scheduler applies them incrementally instead of polling the table.
+
+Run with: python -m app.scheduler
+"""
+
+import heapq
+import json
+import logging
+import os
+import select
+import signal
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select as sql_select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SessionLocal, engine
+from app.models import Reminder
+from app.tasks import REMINDER_CHANGES_CHANNEL, claim_due_reminders, enqueue_reminder_sends
+
+logger = logging.getLogger(__name__)
+
+# Scheduler configuration
+SCHEDULER_LOOKAHEAD_MINUTES = float(os.getenv("SCHEDULER_LOOKAHEAD_MINUTES", "10"))
+SCHEDULER_MAX_PRELOAD = int(os.getenv("SCHEDULER_MAX_PRELOAD", "100000"))
+SCHEDULER_MAX_SLEEP_SECONDS = float(os.getenv("SCHEDULER_MAX_SLEEP_SECONDS", "5"))
+
+
+async def notify_reminder_change(db: AsyncSession, reminder: Reminder, deleted: bool = False):
+    """
+    Publish a reminder change to the scheduler process
+
+    NOTIFY is transactional, so the scheduler only sees the change once the
+    surrounding transaction commits. The reminder must have been flushed.
+    """
+    send_time = None
+    if not deleted and reminder.status == "pending" and reminder.send_time:
+        send_time = reminder.send_time.isoformat()
+    payload = json.dumps({"id": reminder.id, "send_time": send_time})
+    await db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": REMINDER_CHANGES_CHANNEL, "payload": payload}
+    )
+
+async def notify_reminders_reload(db: AsyncSession):
+    """
+    Ask the scheduler to reload its window, e.g. after a bulk insert
+
+    One notification instead of one per reminder; like notify_reminder_change
+    it is only delivered if the surrounding transaction commits.
+    """
+    await db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": REMINDER_CHANGES_CHANNEL, "payload": json.dumps({"reload": True})}
+    )
+
+
+class ReminderScheduler:
+    """
+    Heap of (send_time, reminder_id) for reminders due within the lookahead window
+
+    Entries are never removed from the heap directly. Instead self.scheduled
+    maps each live reminder id to its current send_time, and heap entries that
+    no longer match it are discarded when they reach the top.
+    """
+
+    def __init__(self, lookahead: timedelta = timedelta(minutes=SCHEDULER_LOOKAHEAD_MINUTES),
+                 max_preload: int = SCHEDULER_MAX_PRELOAD):
+        self.lookahead = lookahead
+        self.max_preload = max_preload
+        self.heap: List[Tuple[datetime, int]] = []
+        self.scheduled: Dict[int, datetime] = {}
+        self.horizon = datetime.utcnow()
+        self.running = False
+        self.reload_requested = False
+
+    def reload(self, now: datetime):
+        """Rebuild the heap from the pending reminders due within the window"""
+        horizon = now + self.lookahead
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                sql_select(Reminder.id, Reminder.send_time)
+                .where(Reminder.status == "pending", Reminder.send_time <= horizon)
+                .order_by(Reminder.send_time)
+                .limit(self.max_preload)
+            ).all()
+        finally:
+            db.close()
+
+        self.scheduled = {row.id: row.send_time for row in rows}
+        self.heap = [(row.send_time, row.id) for row in rows]
+        heapq.heapify(self.heap)
+        # A truncated preload only covers reminders up to the last loaded one
+        if len(rows) == self.max_preload:
+            horizon = rows[-1].send_time
+        self.horizon = horizon
+        logger.info("Loaded %d reminders due before %s", len(rows), horizon.isoformat())
+
+    def apply_change(self, payload: str):
+        """Apply a reminder change published by notify_reminder_change"""
+        try:
+            change = json.loads(payload)
+            if change.get("reload"):
+                self.reload_requested = True
+                return
+            reminder_id = int(change["id"])
+            send_time = change.get("send_time")
+            send_time = datetime.fromisoformat(send_time) if send_time else None
+            if send_time and send_time.tzinfo:
+                send_time = send_time.astimezone(timezone.utc).replace(tzinfo=None)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Ignoring malformed reminder change: %s", payload)
+            return
+
+        if send_time is None or send_time > self.horizon:
+            self.scheduled.pop(reminder_id, None)
+            return
+
+        if self.scheduled.get(reminder_id) != send_time:
+            self.scheduled[reminder_id] = send_time
+            heapq.heappush(self.heap, (send_time, reminder_id))
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """Pop the ids of all live reminders due at or before now"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            send_time, reminder_id = heapq.heappop(self.heap)
+            if self.scheduled.get(reminder_id) == send_time:
+                del self.scheduled[reminder_id]
+                due.append(reminder_id)
+        return due
+
+    def seconds_until_next(self, now: datetime) -> Optional[float]:
+        """Seconds until the earliest live heap entry is due"""
+        while self.heap and self.scheduled.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max((self.heap[0][0] - now).total_seconds(), 0.0)
+
+    def fire(self, reminder_ids: List[int], now: datetime):
+        """Claim the given reminders and enqueue their sends"""
+        db = SessionLocal()
+        try:
+            rows = claim_due_reminders(db, now, len(reminder_ids), reminder_ids=reminder_ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to dispatch reminders %s", reminder_ids)
+            return
+        finally:
+            db.close()
+        # Only once the claim is committed, so a failed commit can't leave sends behind
+        if rows:
+            enqueue_reminder_sends(rows)
+        logger.info("Dispatched %d of %d due reminders", len(rows), len(reminder_ids))
+
+    def run(self):
+        """Fire reminders at their send_time until stopped"""
+        # Detached so the autocommit connection never goes back into the pool
+        raw_connection = engine.raw_connection()
+        raw_connection.detach()
+        listen_connection = raw_connection.dbapi_connection
+        listen_connection.autocommit = True
+        cursor = listen_connection.cursor()
+        cursor.execute(f"LISTEN {REMINDER_CHANGES_CHANNEL}")
+
+        self.running = True
+        next_reload = datetime.utcnow()
+        try:
+            while self.running:
+                now = datetime.utcnow()
+                if now >= next_reload or self.reload_requested:
+                    self.reload_requested = False
+                    self.reload(now)
+                    next_reload = min(now + self.lookahead / 2, self.horizon)
+
+                due = self.pop_due(now)
+                if due:
+                    self.fire(due, now)
+                    continue
+
+                timeout = (next_reload - now).total_seconds()
+                until_next = self.seconds_until_next(now)
+                if until_next is not None:
+                    timeout = min(timeout, until_next)
+                timeout = max(min(timeout, SCHEDULER_MAX_SLEEP_SECONDS), 0.0)
+
+                # Sleep until the next reminder is due or a change arrives
+                readable, _, _ = select.select([listen_connection], [], [], timeout)
+                if readable:
+                    listen_connection.poll()
+                    while listen_connection.notifies:
+                        notification = listen_connection.notifies.pop(0)
+                        self.apply_change(notification.payload)
+        finally:
+            cursor.close()
+            raw_connection.close()
+
+    def stop(self, *args):
+        self.running = False
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    scheduler = ReminderScheduler()
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
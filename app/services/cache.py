@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+from app.services.redis_service import get_async_redis, get_redis
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+
+# Namespaces, each invalidated as a whole per tenant
+PAYMENT_STATS_CACHE = "payment_stats"
+TEMPLATES_CACHE = "templates"
+
+# Hash of "<namespace>:hits" / "<namespace>:misses" counters
+CACHE_STATS_KEY = "cache:stats"
+
+# Cached entries live under the tenant's current version of a namespace, so
+# invalidating is a single INCR and the old entries simply expire. A reader
+# that loaded data before an invalidation writes it under the old version,
+# where nobody will read it again.
+#
+# A hit is counted in the same round trip.
+#
+# KEYS[1]: version key, KEYS[2]: stats hash. ARGV[1]: entry key prefix,
+# ARGV[2]: entry key suffix, ARGV[3]: namespace.
+# Returns {version, cached value or false}.
+CACHE_LOOKUP_LUA = """
+local version = redis.call('GET', KEYS[1]) or '0'
+local value = redis.call('GET', ARGV[1] .. version .. ARGV[2])
+if value then
+    redis.call('HINCRBY', KEYS[2], ARGV[3] .. ':hits', 1)
+end
+return {version, value}
+"""
+
+_lookup_script = None
+
+def _version_key(namespace: str, owner_id: int) -> str:
+    return f"cache:{namespace}:{owner_id}:version"
+
+def _entry_prefix(namespace: str, owner_id: int) -> str:
+    return f"cache:{namespace}:{owner_id}:v"
+
+async def cached(namespace: str, owner_id: int, key: str, loader: Callable[[], Awaitable[Any]],
+                 ttl: int = CACHE_TTL_SECONDS) -> Any:
+    """
+    Return a tenant's cached value, or load, cache and return it
+
+    Values are stored as JSON, so the loader's result is passed through
+    jsonable_encoder and hits and misses return the same shape. If Redis is
+    unavailable the loader is called directly.
+
+    Args:
+        namespace: Group of entries invalidated together, e.g. "payment_stats"
+        owner_id: Tenant the entry belongs to
+        key: Entry within the namespace, e.g. the request's query parameters
+        loader: Coroutine function producing the value on a miss
+        ttl: Seconds before the entry expires even without invalidation
+    """
+    global _lookup_script
+    client = get_async_redis()
+    suffix = f":{key}"
+    try:
+        if _lookup_script is None:
+            _lookup_script = client.register_script(CACHE_LOOKUP_LUA)
+        version, value = await _lookup_script(
+            keys=[_version_key(namespace, owner_id), CACHE_STATS_KEY],
+            args=[_entry_prefix(namespace, owner_id), suffix, namespace]
+        )
+    except redis.RedisError as e:
+        logger.warning("Cache unavailable, loading %s directly: %s", namespace, e)
+        return await loader()
+
+    if value is not None:
+        return json.loads(value)
+
+    result = jsonable_encoder(await loader())
+    try:
+        entry_key = f"{_entry_prefix(namespace, owner_id)}{version.decode()}{suffix}"
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(entry_key, json.dumps(result), ex=ttl)
+            pipe.hincrby(CACHE_STATS_KEY, f"{namespace}:misses", 1)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not cache %s: %s", namespace, e)
+    return result
+
+async def current_version(namespace: str, owner_id: int) -> Optional[str]:
+    """
+    A tenant's current version of a namespace, or None if Redis is unavailable
+
+    Lets a process-local cache check its copies against invalidations made
+    by other processes with a single GET.
+    """
+    try:
+        version = await get_async_redis().get(_version_key(namespace, owner_id))
+    except redis.RedisError as e:
+        logger.warning("Cache unavailable, no version for %s: %s", namespace, e)
+        return None
+    return version.decode() if version is not None else "0"
+
+async def invalidate(namespace: str, owner_id: int) -> Optional[str]:
+    """
+    Drop all of a tenant's cached entries in a namespace
+
+    Returns:
+        The new version, or None if Redis is unavailable
+    """
+    try:
+        return str(await get_async_redis().incr(_version_key(namespace, owner_id)))
+    except redis.RedisError as e:
+        logger.warning("Could not invalidate cache %s for owner %s: %s", namespace, owner_id, e)
+        return None
+
+def invalidate_sync(namespace: str, owner_id: int):
+    """invalidate() for synchronous code such as Celery tasks"""
+    try:
+        get_redis().incr(_version_key(namespace, owner_id))
+    except redis.RedisError as e:
+        logger.warning("Could not invalidate cache %s for owner %s: %s", namespace, owner_id, e)
+
+async def get_cache_stats() -> Optional[Dict[str, Dict[str, Any]]]:
+    """Hit and miss counters per namespace, with the hit ratio; None if Redis is unavailable"""
+    try:
+        raw = await get_async_redis().hgetall(CACHE_STATS_KEY)
+    except redis.RedisError as e:
+        logger.warning("Cache unavailable, no stats: %s", e)
+        return None
+    stats: Dict[str, Dict[str, Any]] = {}
+    for field, count in raw.items():
+        namespace, outcome = field.decode().rsplit(":", 1)
+        stats.setdefault(namespace, {"hits": 0, "misses": 0})[outcome] = int(count)
+    for counters in stats.values():
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,140 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Customer
+
+IMPORT_CHUNK_ROWS = int(os.getenv("CUSTOMER_IMPORT_CHUNK_ROWS", "5000"))
+# Every failure is counted, but only the first ones are reported row by row
+MAX_REPORTED_FAILURES = int(os.getenv("CUSTOMER_IMPORT_MAX_REPORTED_FAILURES", "1000"))
+
+COPY_CUSTOMERS_SQL = (
+    "COPY customers (name, phone, notes, owner_id, created_at, updated_at) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+ProgressCallback = Callable[[int, int], None]
+
+def iter_csv_chunks(binary_file: BinaryIO, chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Stream (row_number, row) chunks from a CSV file without loading it into memory
+
+    Row numbers start at 2 to account for the header row.
+    """
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8", newline="")
+    try:
+        chunk = []
+        for row_num, row in enumerate(csv.DictReader(text_file), start=2):
+            chunk.append((row_num, row))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        # Leave the underlying file open for the caller
+        text_file.detach()
+
+def _copy_customers(db: Session, owner_id: int, rows: List[Tuple[int, Dict[str, Any]]]):
+    """Insert rows with COPY on the session's connection (inside its transaction)"""
+    now = datetime.utcnow()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for _, row in rows:
+        writer.writerow([row["name"], row["phone"], row.get("notes"), owner_id, now, now])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(COPY_CUSTOMERS_SQL, buffer)
+    finally:
+        cursor.close()
+
+def import_customers_csv(db: Session, owner_id: int, binary_file: BinaryIO,
+                         on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Import customers from a CSV file with name, phone and optional notes columns
+
+    The file is parsed in chunks. Each chunk is checked against the owner's
+    existing phones with one query and inserted with COPY, so memory and
+    round trips stay constant per chunk. Nothing is committed here.
+
+    Args:
+        db: Database session
+        owner_id: User who owns the imported customers
+        binary_file: CSV file opened in binary mode
+        on_progress: Called with (rows_processed, rows_failed) after each chunk
+
+    Returns:
+        Counts of imported and failed rows, and the failed rows with their errors
+    """
+    success_count = 0
+    failed_count = 0
+    failed_rows = []
+    seen_phones = set()
+
+    def fail(row_num, row, error):
+        nonlocal failed_count
+        failed_count += 1
+        if len(failed_rows) < MAX_REPORTED_FAILURES:
+            failed_rows.append({"row": row_num, "data": row, "error": error})
+
+    for chunk in iter_csv_chunks(binary_file):
+        candidates = []
+        for row_num, row in chunk:
+            # Check required fields
+            if not row.get("name") or not row.get("phone"):
+                fail(row_num, row, "Missing required fields (name, phone)")
+                continue
+            if row["phone"] in seen_phones:
+                fail(row_num, row, f"Customer with phone {row['phone']} already exists")
+                continue
+            seen_phones.add(row["phone"])
+            candidates.append((row_num, row))
+
+        # One set-based duplicate check per chunk
+        existing_phones = set()
+        if candidates:
+            existing_phones = set(db.scalars(
+                select(Customer.phone).where(
+                    Customer.owner_id == owner_id,
+                    Customer.phone.in_([row["phone"] for _, row in candidates])
+                )
+            ))
+
+        accepted = []
+        for row_num, row in candidates:
+            if row["phone"] in existing_phones:
+                fail(row_num, row, f"Customer with phone {row['phone']} already exists")
+            else:
+                accepted.append((row_num, row))
+
+        if accepted:
+            try:
+                with db.begin_nested():
+                    _copy_customers(db, owner_id, accepted)
+                success_count += len(accepted)
+            except psycopg2.Error:
+                # Retry row by row so the report names the offending rows
+                for row_num, row in accepted:
+                    try:
+                        with db.begin_nested():
+                            _copy_customers(db, owner_id, [(row_num, row)])
+                        success_count += 1
+                    except psycopg2.Error as e:
+                        fail(row_num, row, str(e).strip())
+
+        if on_progress:
+            on_progress(success_count + failed_count, failed_count)
+
+    return {
+        "success_count": success_count,
+        "failed_count": failed_count,
+        "failed_rows": failed_rows
+    }
@@ -0,0 +1,81 @@
+import re
+from typing import Optional
+
+from sqlalchemy import case, func, literal, or_
+
+from app.models import Customer
+from app.services.identifiers import PHONE_DEFAULT_COUNTRY_CODE
+
+# Searches made only of these characters are treated as phone numbers
+PHONE_SEARCH_PATTERN = re.compile(r"^\+?[\d\s().-]+$")
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _phone_prefixes(search: str) -> list:
+    """Digit prefixes of customers.phone_digits a phone-like search can match"""
+    if not PHONE_SEARCH_PATTERN.match(search):
+        return []
+    digits = re.sub(r"\D", "", search)
+    if not digits:
+        return []
+    if search.startswith("+") or digits.startswith(PHONE_DEFAULT_COUNTRY_CODE):
+        return [digits]
+    national = digits.lstrip("0")
+    return [digits, PHONE_DEFAULT_COUNTRY_CODE + national] if national else [digits]
+
+def _digits_successor(prefix: str) -> Optional[str]:
+    """Smallest digit string after every string starting with prefix, e.g. "919" -> "92"; None for all 9s"""
+    stripped = prefix.rstrip("9")
+    if not stripped:
+        return None
+    return stripped[:-1] + str(int(stripped[-1]) + 1)
+
+def _phone_prefix_match(prefix: str):
+    # A range rather than LIKE 'prefix%', so the (owner_id, phone_digits) btree
+    # is used with bound parameters too. Both bounds are digits only, like
+    # phone_digits, and digit strings sort the same in any collation.
+    match = Customer.phone_digits >= prefix
+    upper = _digits_successor(prefix)
+    if upper is not None:
+        match &= Customer.phone_digits < upper
+    return match
+
+def customer_search_filter(search: str):
+    """
+    WHERE clause matching customers by name, notes or phone number
+
+    Name and notes are substring matches served by the pg_trgm GIN indexes.
+    Phone-like searches match a prefix of the digits-only phone_digits
+    column, with or without the default country code.
+    """
+    search = search.strip()
+    term = f"%{_like_escape(search)}%"
+    clauses = [Customer.name.ilike(term), Customer.notes.ilike(term)]
+    for prefix in _phone_prefixes(search):
+        clauses.append(_phone_prefix_match(prefix))
+    return or_(*clauses)
+
+def customer_search_rank(search: str):
+    """
+    Relevance of a matching customer, from 0 to 1
+
+    Phone prefix matches rank first, then trigram similarity of the name,
+    then of the notes.
+    """
+    search = search.strip()
+    prefixes = _phone_prefixes(search)
+    text_rank = func.greatest(
+        func.word_similarity(search, Customer.name),
+        func.coalesce(func.word_similarity(search, Customer.notes), 0) * 0.5,
+    )
+    if not prefixes:
+        return text_rank
+    phone_match = or_(*(_phone_prefix_match(prefix) for prefix in prefixes))
+    return case((phone_match, literal(1.0)), else_=text_rank)
+
+def search_customers(query, search: Optional[str]):
+    """Apply a customer search to a select over Customer, if there is one"""
+    if not search or not search.strip():
+        return query
+    return query.where(customer_search_filter(search))
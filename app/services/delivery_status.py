@@ -0,0 +1,154 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import Integer, String, and_, case, column, func, or_, update, values
+from sqlalchemy.orm import Session
+
+from app.models import Reminder, ReminderStatus
+
+load_dotenv()
+
+# Public URL of POST /reminders/status-callback. Status callbacks are only
+# requested from Twilio when this is set.
+TWILIO_STATUS_CALLBACK_URL = os.getenv("TWILIO_STATUS_CALLBACK_URL")
+
+# Redis list buffering raw callbacks between the endpoint and the ingest task
+STATUS_CALLBACK_QUEUE = "twilio:status_callbacks"
+
+# Twilio MessageStatus -> reminder status
+TWILIO_STATUS_MAP = {
+    "accepted": ReminderStatus.QUEUED.value,
+    "scheduled": ReminderStatus.QUEUED.value,
+    "queued": ReminderStatus.QUEUED.value,
+    "sending": ReminderStatus.QUEUED.value,
+    "sent": ReminderStatus.SENT.value,
+    "delivered": ReminderStatus.DELIVERED.value,
+    "read": ReminderStatus.READ.value,
+    "failed": ReminderStatus.FAILED.value,
+    "undelivered": ReminderStatus.FAILED.value,
+    "canceled": ReminderStatus.FAILED.value,
+}
+
+# State machine: a reminder only moves to a status of higher rank, so
+# duplicate and out-of-order events are no-ops. Failed and delivered share a
+# rank, which makes both of them final for each other.
+STATUS_RANK = {
+    ReminderStatus.PENDING.value: 0,
+    ReminderStatus.QUEUED.value: 1,
+    ReminderStatus.SENT.value: 2,
+    ReminderStatus.DELIVERED.value: 3,
+    ReminderStatus.FAILED.value: 3,
+    ReminderStatus.READ.value: 4,
+}
+
+def status_callback_url(reminder_id: Optional[int]) -> Optional[str]:
+    """Status callback URL for a reminder's message, or None if callbacks are disabled"""
+    if not TWILIO_STATUS_CALLBACK_URL or reminder_id is None:
+        return None
+    return f"{TWILIO_STATUS_CALLBACK_URL}?reminder_id={reminder_id}"
+
+def _rank(expression):
+    return case(STATUS_RANK, value=expression, else_=0)
+
+def apply_status_updates(db: Session, updates: Iterable[Dict[str, Any]]) -> int:
+    """
+    Apply reminder status transitions with a single UPDATE ... FROM (VALUES ...)
+
+    Each update has reminder_id, status and optionally message_sid and
+    error_code. Several updates for the same reminder collapse to the one
+    with the highest rank, and transitions that would move a reminder
+    backwards are skipped. A recurring reminder that is pending its next
+    occurrence keeps its status and only records the latest message SID and
+    error code. The incoming SID replaces the stored one, and any update
+    other than a failure clears the error code. Nothing is committed here.
+
+    Returns:
+        Number of reminders updated
+    """
+    latest: Dict[int, Dict[str, Any]] = {}
+    for item in updates:
+        if item.get("status") not in STATUS_RANK:
+            continue
+        current = latest.get(item["reminder_id"])
+        if current is None:
+            latest[item["reminder_id"]] = dict(item)
+            continue
+        if STATUS_RANK[item["status"]] > STATUS_RANK[current["status"]]:
+            current["status"] = item["status"]
+            current["error_code"] = item.get("error_code")
+        # Updates are in arrival order: the latest send's SID wins
+        current["message_sid"] = item.get("message_sid") or current.get("message_sid")
+    if not latest:
+        return 0
+
+    incoming = values(
+        column("reminder_id", Integer),
+        column("status", String),
+        column("message_sid", String),
+        column("error_code", String),
+        name="incoming"
+    ).data([
+        (reminder_id, item["status"], item.get("message_sid"), item.get("error_code"))
+        for reminder_id, item in latest.items()
+    ])
+
+    awaiting_next = and_(
+        Reminder.recurrence_rule.is_not(None),
+        Reminder.status == ReminderStatus.PENDING.value
+    )
+    result = db.execute(
+        update(Reminder)
+        .where(
+            Reminder.id == incoming.c.reminder_id,
+            or_(_rank(Reminder.status) < _rank(incoming.c.status), awaiting_next)
+        )
+        .values(
+            status=case((awaiting_next, Reminder.status), else_=incoming.c.status),
+            message_sid=func.coalesce(incoming.c.message_sid, Reminder.message_sid),
+            # A later successful send clears the error of an earlier failed occurrence
+            error_code=case(
+                (incoming.c.status == ReminderStatus.FAILED.value,
+                 func.coalesce(incoming.c.error_code, Reminder.error_code)),
+                else_=None
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def send_results_to_updates(reminder_ids: List[Optional[int]], results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn Twilio send results into status updates for the reminders they were sent for"""
+    updates = []
+    for reminder_id, result in zip(reminder_ids, results):
+        if reminder_id is None:
+            continue
+        if result.get("sid"):
+            updates.append({
+                "reminder_id": reminder_id,
+                "status": ReminderStatus.SENT.value,
+                "message_sid": result["sid"]
+            })
+        else:
+            updates.append({
+                "reminder_id": reminder_id,
+                "status": ReminderStatus.FAILED.value,
+                "error_code": str(result.get("status_code") or "send_error")
+            })
+    return updates
+
+def callbacks_to_updates(callbacks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn raw Twilio status callback payloads into status updates"""
+    updates = []
+    for callback in callbacks:
+        status = TWILIO_STATUS_MAP.get((callback.get("MessageStatus") or "").lower())
+        reminder_id = callback.get("reminder_id")
+        if status is None or not str(reminder_id or "").isdigit():
+            continue
+        updates.append({
+            "reminder_id": int(reminder_id),
+            "status": status,
+            "message_sid": callback.get("MessageSid"),
+            "error_code": callback.get("ErrorCode")
+        })
+    return updates
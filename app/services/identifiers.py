@@ -0,0 +1,55 @@
+import os
+import re
+from typing import Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Country code for phone numbers given without one, e.g. "98765 43210"
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "91")
+
+# Longest national number written without a country code
+NATIONAL_NUMBER_MAX_DIGITS = 10
+
+def normalize_email(email: str) -> str:
+    """Emails are stored and looked up lower-cased"""
+    return email.strip().lower()
+
+def normalize_phone(phone: str) -> str:
+    """
+    A phone number in E.164 form, e.g. "+919876543210"
+
+    "+" and "00" prefixes mark an international number. Anything else is a
+    national number: a leading trunk "0" is dropped and, if what is left is
+    no longer than a national number, the default country code is added.
+
+    Raises:
+        ValueError: if the result is not a plausible E.164 number
+    """
+    phone = phone.strip()
+    digits = re.sub(r"\D", "", phone)
+    if phone.startswith("00"):
+        digits = digits[2:]
+    elif not phone.startswith("+"):
+        digits = digits.lstrip("0")
+        if len(digits) <= NATIONAL_NUMBER_MAX_DIGITS:
+            digits = PHONE_DEFAULT_COUNTRY_CODE + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        raise ValueError("Invalid phone number")
+    return f"+{digits}"
+
+def login_identifier(username: str) -> Tuple[str, str]:
+    """
+    ("email", value) or ("phone", value) for what a user typed to log in
+
+    Anything with an "@" is an email; anything else that normalizes as a
+    phone number is one. Otherwise it is looked up as an email and simply
+    won't match.
+    """
+    if "@" not in username:
+        try:
+            return "phone", normalize_phone(username)
+        except ValueError:
+            pass
+    return "email", normalize_email(username)
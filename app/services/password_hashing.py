@@ -0,0 +1,65 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# bcrypt cost (log2 rounds). Hashes with any other cost are rehashed at the
+# owner's next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Threads doing bcrypt work, per API process. bcrypt releases the GIL, so
+# these run in parallel with the event loop and each other.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash operations allowed to run or wait for a thread; beyond that, callers
+# wait up to PASSWORD_HASH_QUEUE_TIMEOUT seconds for a slot and then get a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    # Any other cost, higher or lower, marks a hash as needing an update
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots: Optional[asyncio.Semaphore] = None
+
+async def _run(func, *args):
+    """Run a bcrypt call on the hashing pool, shedding load once it is saturated"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in attempts in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _slots.release()
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password against its stored hash
+
+    Returns:
+        (matches, new_hash). new_hash is set when the password matched but
+        the stored hash uses outdated parameters; the caller should save it.
+    """
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
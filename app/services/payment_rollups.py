@@ -0,0 +1,68 @@
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models import Payment, PaymentDailyRollup
+
+class RollupEntry(NamedTuple):
+    """The part of a payment that the daily rollups depend on"""
+    owner_id: int
+    day: date
+    status: str
+    amount: float
+
+def rollup_entry(payment: Optional[Payment]) -> Optional[RollupEntry]:
+    """Snapshot a payment before or after a change; None if it is not counted"""
+    if payment is None or payment.owner_id is None or payment.created_at is None or payment.status is None:
+        return None
+    return RollupEntry(payment.owner_id, payment.created_at.date(), payment.status, payment.amount or 0)
+
+def _upsert(owner_id: int, day: date, status: str, count: int, amount: float):
+    stmt = insert(PaymentDailyRollup).values(
+        owner_id=owner_id,
+        day=day,
+        status=status,
+        payment_count=count,
+        amount=amount
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[PaymentDailyRollup.owner_id, PaymentDailyRollup.day, PaymentDailyRollup.status],
+        set_={
+            "payment_count": PaymentDailyRollup.payment_count + stmt.excluded.payment_count,
+            "amount": PaymentDailyRollup.amount + stmt.excluded.amount,
+        }
+    )
+
+def rollup_batch_statements(changes: Iterable[Tuple[Optional[RollupEntry], Optional[RollupEntry]]]) -> List:
+    """
+    Upserts applying several (before, after) changes, one per rollup row
+
+    The changes are netted per (owner_id, day, status) and the rows are
+    upserted in that sorted order, so concurrent transactions always lock
+    rollup rows in the same order and can't deadlock on them.
+    """
+    deltas: Dict[Tuple[int, date, str], List] = {}
+    for before, after in changes:
+        if before == after:
+            continue
+        for entry, sign in ((before, -1), (after, 1)):
+            if entry is not None:
+                delta = deltas.setdefault((entry.owner_id, entry.day, entry.status), [0, 0])
+                delta[0] += sign
+                delta[1] += sign * entry.amount
+    return [
+        _upsert(*key, count, amount)
+        for key, (count, amount) in sorted(deltas.items())
+        if count or amount
+    ]
+
+def rollup_statements(before: Optional[RollupEntry], after: Optional[RollupEntry]) -> List:
+    """
+    Upserts that move a payment's contribution from `before` to `after`
+
+    Pass None as `before` for a new payment and as `after` for a deleted one.
+    The statements must run in the same transaction as the payment write, with
+    the payment row locked, so the rollups never drift from the payments table.
+    """
+    return rollup_batch_statements([(before, after)])
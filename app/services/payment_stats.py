@@ -0,0 +1,171 @@
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import DateTime, Select, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Payment, PaymentDailyRollup, PaymentStatus
+from app.services.timestamps import naive_utc
+
+# Granularities accepted for the bucketed series (Postgres date_trunc fields)
+SERIES_BUCKETS = ("day", "month")
+
+STAT_FIELDS = (
+    "total_payments",
+    "total_amount",
+    "completed_payments",
+    "pending_payments",
+    "failed_payments",
+    "completed_amount",
+)
+
+def _aggregate_columns(status, count, amount):
+    """COUNT/SUM columns for every status, computed in a single pass"""
+    def count_status(payment_status: PaymentStatus):
+        return func.coalesce(count.filter(status == payment_status.value), 0)
+
+    return [
+        func.coalesce(count, 0).label("total_payments"),
+        func.coalesce(func.sum(amount), 0).label("total_amount"),
+        count_status(PaymentStatus.COMPLETED).label("completed_payments"),
+        count_status(PaymentStatus.PENDING).label("pending_payments"),
+        count_status(PaymentStatus.FAILED).label("failed_payments"),
+        func.coalesce(
+            func.sum(amount).filter(status == PaymentStatus.COMPLETED.value), 0
+        ).label("completed_amount"),
+    ]
+
+def _payment_columns():
+    return _aggregate_columns(Payment.status, func.count(), Payment.amount)
+
+def _rollup_columns():
+    return _aggregate_columns(
+        PaymentDailyRollup.status, func.sum(PaymentDailyRollup.payment_count), PaymentDailyRollup.amount
+    )
+
+def _bucket(bucket: str, column):
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+    # Inlined (it is whitelisted above) so SELECT and GROUP BY are the same expression
+    return func.date_trunc(literal_column(f"'{bucket}'"), column).label("period")
+
+def _apply_range(query: Select, owner_id: int, from_date: Optional[datetime], to_date: Optional[datetime],
+                 before: Optional[datetime] = None) -> Select:
+    query = query.where(Payment.owner_id == owner_id)
+    if from_date:
+        query = query.where(Payment.created_at >= from_date)
+    if to_date:
+        query = query.where(Payment.created_at <= to_date)
+    if before:
+        query = query.where(Payment.created_at < before)
+    return query
+
+def _apply_day_range(query: Select, owner_id: int, first_day, end_day) -> Select:
+    query = query.where(PaymentDailyRollup.owner_id == owner_id)
+    if first_day:
+        query = query.where(PaymentDailyRollup.day >= first_day)
+    if end_day:
+        query = query.where(PaymentDailyRollup.day < end_day)
+    return query
+
+def payment_stats_query(owner_id: int, from_date: Optional[datetime] = None,
+                        to_date: Optional[datetime] = None, before: Optional[datetime] = None) -> Select:
+    """One-row aggregate of an owner's payments in the date range"""
+    return _apply_range(select(*_payment_columns()), owner_id, from_date, to_date, before)
+
+def payment_series_query(owner_id: int, bucket: str, from_date: Optional[datetime] = None,
+                         to_date: Optional[datetime] = None, before: Optional[datetime] = None) -> Select:
+    """
+    The same aggregate grouped per day or month of created_at
+
+    Only one row per non-empty bucket comes back from the database, so the
+    response size depends on the range, not on the number of payments.
+    """
+    period = _bucket(bucket, Payment.created_at)
+    query = select(period, *_payment_columns()).group_by(period).order_by(period)
+    return _apply_range(query, owner_id, from_date, to_date, before)
+
+def rollup_stats_query(owner_id: int, first_day=None, end_day=None) -> Select:
+    """The stats aggregate over whole days, read from payment_daily_rollups"""
+    return _apply_day_range(select(*_rollup_columns()), owner_id, first_day, end_day)
+
+def rollup_series_query(owner_id: int, bucket: str, first_day=None, end_day=None) -> Select:
+    """The bucketed series over whole days, read from payment_daily_rollups"""
+    # As a timestamp, so periods line up with the ones from payment_series_query
+    period = _bucket(bucket, cast(PaymentDailyRollup.day, DateTime))
+    query = select(period, *_rollup_columns()).group_by(period).order_by(period)
+    return _apply_day_range(query, owner_id, first_day, end_day)
+
+def _add(totals: Dict[str, Any], row: Any):
+    for field in STAT_FIELDS:
+        totals[field] = totals.get(field, 0) + (getattr(row, field) or 0)
+
+async def load_payment_stats(db: AsyncSession, owner_id: int, from_date: Optional[datetime] = None,
+                             to_date: Optional[datetime] = None, bucket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Payment stats for a date range, mostly read from the daily rollups
+
+    Whole days inside the range come from payment_daily_rollups, so the cost
+    grows with the number of days. Only the partial days at either end (when
+    the bounds are not at midnight) are aggregated from payments.
+
+    Returns:
+        The summary, plus a per-day or per-month "series" when bucket is set
+    """
+    from_date, to_date = naive_utc(from_date), naive_utc(to_date)
+
+    # Whole days are [first_day, end_day); the day of to_date is always partial
+    # because the bound is inclusive.
+    first_day = None
+    if from_date:
+        first_day = from_date.date() if from_date.time() == time.min else from_date.date() + timedelta(days=1)
+    end_day = to_date.date() if to_date else None
+
+    pieces = []
+    if first_day and end_day and first_day >= end_day:
+        # Less than a whole day in range: the payments scan is already small
+        pieces.append(("payments", {"from_date": from_date, "to_date": to_date}))
+    else:
+        pieces.append(("rollups", {"first_day": first_day, "end_day": end_day}))
+        if from_date and from_date.time() != time.min:
+            pieces.append(("payments", {"from_date": from_date, "before": datetime.combine(first_day, time.min)}))
+        if to_date:
+            pieces.append(("payments", {"from_date": datetime.combine(end_day, time.min), "to_date": to_date}))
+
+    totals: Dict[str, Any] = {}
+    for source, bounds in pieces:
+        query = rollup_stats_query(owner_id, **bounds) if source == "rollups" else payment_stats_query(owner_id, **bounds)
+        _add(totals, (await db.execute(query)).one())
+    stats = summarize_totals(totals)
+
+    if bucket:
+        periods: Dict[datetime, Dict[str, Any]] = {}
+        for source, bounds in pieces:
+            if source == "rollups":
+                query = rollup_series_query(owner_id, bucket, **bounds)
+            else:
+                query = payment_series_query(owner_id, bucket, **bounds)
+            async for row in await db.stream(query):
+                _add(periods.setdefault(row.period, {}), row)
+        stats["series"] = [
+            {"period": period, **summarize_totals(periods[period])}
+            for period in sorted(periods)
+        ]
+
+    return stats
+
+def summarize_totals(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn summed aggregate fields into the stats payload, with the completion rate"""
+    total_payments = int(totals.get("total_payments") or 0)
+    completed_payments = int(totals.get("completed_payments") or 0)
+    completion_rate = (completed_payments / total_payments * 100) if total_payments > 0 else 0
+    return {
+        "total_payments": total_payments,
+        # Rounded to paise: rollups accumulate float additions and subtractions
+        "total_amount": round(float(totals.get("total_amount") or 0), 2),
+        "completed_payments": completed_payments,
+        "pending_payments": int(totals.get("pending_payments") or 0),
+        "failed_payments": int(totals.get("failed_payments") or 0),
+        "completed_amount": round(float(totals.get("completed_amount") or 0), 2),
+        "completion_rate": round(completion_rate, 2)
+    }
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User
+from app.services import cache
+
+load_dotenv()
+
+# How long a process trusts its copy of a user. Changes made through this
+# process take effect immediately; other workers see them (including a
+# deactivation or token revocation) within this window.
+PRINCIPAL_LOCAL_TTL_SECONDS = float(os.getenv("PRINCIPAL_LOCAL_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# Optional shared tier, so a local miss costs a Redis GET rather than a SELECT
+PRINCIPAL_CACHE_REDIS = os.getenv("PRINCIPAL_CACHE_REDIS", "true").lower() == "true"
+PRINCIPAL_REDIS_TTL_SECONDS = int(os.getenv("PRINCIPAL_REDIS_TTL_SECONDS", "300"))
+
+# cache.py namespace of the Redis tier
+PRINCIPALS_CACHE = "principals"
+
+# User columns the API needs from the authenticated user
+PRINCIPAL_FIELDS = (
+    "id", "email", "phone", "is_active", "token_version",
+    "business_name", "business_logo", "business_whatsapp", "created_at",
+)
+
+class PrincipalCache:
+    """Thread-safe LRU of users' fields with a per-entry expiry"""
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_LOCAL_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(found, fields); fields is None for a user known not to exist"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, entry[1]
+
+    def put(self, user_id: int, fields: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+principal_cache = PrincipalCache()
+
+def _fields(user: Optional[User]) -> Optional[Dict[str, Any]]:
+    if user is None:
+        return None
+    fields = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    if isinstance(fields["created_at"], datetime):
+        fields["created_at"] = fields["created_at"].isoformat()
+    return fields
+
+def _principal(fields: Dict[str, Any]) -> User:
+    """
+    A detached User built from cached fields
+
+    Each request gets its own instance, so a handler changing it cannot
+    change the cache. It is not in any session: handlers that modify the
+    user load it from their session first.
+    """
+    values = dict(fields)
+    if values["created_at"] is not None:
+        values["created_at"] = datetime.fromisoformat(values["created_at"])
+    return User(**values)
+
+async def get_principal(db: AsyncSession, user_id: int) -> Optional[User]:
+    """
+    The user an access token belongs to, without a query in the common case
+
+    Looked up in the process-local LRU, then in Redis (if enabled), and only
+    then in the database.
+
+    Returns:
+        A detached User, or None if there is no such user
+    """
+    found, fields = principal_cache.get(user_id)
+    if not found:
+        async def load():
+            return _fields(await db.get(User, user_id))
+        if PRINCIPAL_CACHE_REDIS:
+            fields = await cache.cached(PRINCIPALS_CACHE, user_id, "user", load, ttl=PRINCIPAL_REDIS_TTL_SECONDS)
+        else:
+            fields = await load()
+        principal_cache.put(user_id, fields)
+    return _principal(fields) if fields is not None else None
+
+async def invalidate_principal(user_id: int):
+    """Drop a user's cached fields after a change to the row has been committed"""
+    principal_cache.forget(user_id)
+    if PRINCIPAL_CACHE_REDIS:
+        await cache.invalidate(PRINCIPALS_CACHE, user_id)
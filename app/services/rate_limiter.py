@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import random
+import time
+from typing import List, NamedTuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Reserves `requested` tokens from every bucket in KEYS atomically.
+#
+# A bucket may go into debt down to -rate * max_queue_seconds: callers then
+# hold a reservation and wait until the debt has been refilled, which queues
+# concurrent senders in arrival order and paces them at exactly `rate`
+# instead of letting them retry in bursts.
+#
+# ARGV: requested, max_queue_seconds, then rate and capacity for each key.
+# Returns the milliseconds to wait before sending (>= 0, tokens consumed), or
+# minus the milliseconds after which to try again (< 0, queue full).
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local requested = tonumber(ARGV[1])
+local max_queue_ms = tonumber(ARGV[2]) * 1000
+local wait = 0
+local rejected = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+    local remaining = tokens - requested
+    if remaining < 0 then
+        local deficit_ms = math.ceil(-remaining * 1000 / rate)
+        if deficit_ms > max_queue_ms then
+            rejected = math.max(rejected, deficit_ms - max_queue_ms)
+        end
+        wait = math.max(wait, deficit_ms)
+    end
+    levels[i] = remaining
+end
+if rejected > 0 then
+    return -rejected
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil((capacity - levels[i]) * 1000 / rate) + 1000)
+end
+return wait
+"""
+
+class Bucket(NamedTuple):
+    key: str
+    rate: float  # tokens per second
+    capacity: float  # burst size
+
+class TokenBucketLimiter:
+    """
+    Distributed token bucket shared by every process using the same Redis
+
+    All buckets are charged together, so a send only goes out when every
+    limit it is subject to (e.g. per sending number and per account) allows
+    it. Works with redis-py clients, fakeredis, and their asyncio variants.
+    """
+
+    def __init__(self, redis_client, buckets: List[Bucket], max_queue_seconds: float = 30.0):
+        self.buckets = buckets
+        self.max_queue_seconds = max_queue_seconds
+        self._script = redis_client.register_script(TOKEN_BUCKET_LUA)
+
+    def _script_args(self, tokens: float):
+        keys = [bucket.key for bucket in self.buckets]
+        args = [tokens, self.max_queue_seconds]
+        for bucket in self.buckets:
+            args.extend([bucket.rate, bucket.capacity])
+        return keys, args
+
+    @staticmethod
+    def _jitter(seconds: float) -> float:
+        return seconds + random.uniform(0, min(seconds, 1.0) * 0.1)
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until the tokens are reserved; returns the seconds waited"""
+        keys, args = self._script_args(tokens)
+        waited = 0.0
+        while True:
+            try:
+                result = int(self._script(keys=keys, args=args))
+            except redis.RedisError as e:
+                # Fail open: the provider's 429 handling is the safety net
+                logger.warning("Rate limiter unavailable, sending unthrottled: %s", e)
+                return waited
+            delay = self._jitter(abs(result) / 1000) if result else 0.0
+            time.sleep(delay)
+            waited += delay
+            if result >= 0:
+                return waited
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """acquire() for an asyncio Redis client"""
+        keys, args = self._script_args(tokens)
+        waited = 0.0
+        while True:
+            try:
+                result = int(await self._script(keys=keys, args=args))
+            except redis.RedisError as e:
+                logger.warning("Rate limiter unavailable, sending unthrottled: %s", e)
+                return waited
+            delay = self._jitter(abs(result) / 1000) if result else 0.0
+            await asyncio.sleep(delay)
+            waited += delay
+            if result >= 0:
+                return waited
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retrying throttled requests"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import aiohttp
+from dotenv import load_dotenv
+
+from app.services.rate_limiter import backoff_delay
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Point at a local mock server in development and tests
+RAZORPAY_API_BASE = os.getenv("RAZORPAY_API_BASE", "https://api.razorpay.com")
+RAZORPAY_REQUEST_TIMEOUT = float(os.getenv("RAZORPAY_REQUEST_TIMEOUT", "10"))
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT", "3"))
+RAZORPAY_MAX_CONNECTIONS = int(os.getenv("RAZORPAY_MAX_CONNECTIONS", "20"))
+RAZORPAY_KEEPALIVE_SECONDS = float(os.getenv("RAZORPAY_KEEPALIVE_SECONDS", "30"))
+RAZORPAY_MAX_RETRIES = int(os.getenv("RAZORPAY_MAX_RETRIES", "2"))
+
+# Circuit breaker: after this many consecutive failed attempts, calls fail
+# fast for RAZORPAY_BREAKER_RESET_SECONDS, then a single trial call decides
+# whether to close the circuit again
+RAZORPAY_BREAKER_FAILURES = int(os.getenv("RAZORPAY_BREAKER_FAILURES", "5"))
+RAZORPAY_BREAKER_RESET_SECONDS = float(os.getenv("RAZORPAY_BREAKER_RESET_SECONDS", "30"))
+
+# Responses worth retrying: throttling and server-side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open trial call"""
+
+    def __init__(self, failure_threshold: int = RAZORPAY_BREAKER_FAILURES,
+                 reset_timeout: float = RAZORPAY_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Razorpay circuit opened after %d consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+class RazorpayClient:
+    """
+    Asynchronous client for the Razorpay REST API
+
+    Requests share one aiohttp session per event loop, so connections are
+    kept alive and reused. Throttled (429) and 5xx responses, timeouts and
+    connection errors are retried with jittered exponential backoff, and a
+    circuit breaker fails calls fast while Razorpay keeps failing.
+
+    Methods return the decoded response, or a dict with an "error" key (and
+    "status_code" when Razorpay answered, "field" when it named the invalid
+    one), like the synchronous functions in razorpay_service.
+    """
+
+    def __init__(self, key_id: str, key_secret: str, base_url: str = RAZORPAY_API_BASE,
+                 timeout: float = RAZORPAY_REQUEST_TIMEOUT, connect_timeout: float = RAZORPAY_CONNECT_TIMEOUT,
+                 max_connections: int = RAZORPAY_MAX_CONNECTIONS, max_retries: int = RAZORPAY_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._auth = aiohttp.BasicAuth(key_id, key_secret)
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Sessions can't be shared between event loops (asyncio.run in a task makes a new one)
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections, keepalive_timeout=RAZORPAY_KEEPALIVE_SECONDS),
+                auth=self._auth,
+                timeout=self._timeout,
+                raise_for_status=False
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def request(self, method: str, path: str, json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Call an API endpoint, e.g. request("POST", "/v1/payment_links", data)"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                return {"error": "Razorpay is unavailable (circuit open)", "status_code": 503}
+            delay = backoff_delay(attempt)
+            try:
+                async with self._get_session().request(method, url, json=json) as response:
+                    payload = await response.json(content_type=None)
+                    if response.status < 400:
+                        self.breaker.record_success()
+                        return payload
+                    if response.status not in RETRY_STATUSES:
+                        # The request was wrong, not Razorpay: don't count it against the circuit
+                        self.breaker.record_success()
+                        error = payload.get("error") if isinstance(payload, dict) else None
+                        error = error if isinstance(error, dict) else {}
+                        result = {"error": error.get("description") or f"HTTP {response.status}",
+                                  "status_code": response.status}
+                        if error.get("field"):
+                            result["field"] = error["field"]
+                        return result
+                    self.breaker.record_failure()
+                    result = {"error": f"HTTP {response.status}", "status_code": response.status}
+                    if response.status == 429 and "Retry-After" in response.headers:
+                        try:
+                            delay = float(response.headers["Retry-After"])
+                        except ValueError:
+                            pass
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.breaker.record_failure()
+                result = {"error": str(e) or e.__class__.__name__}
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        return result
+
+    async def create_payment_link(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request("POST", "/v1/payment_links", data)
+
+    async def fetch_payment_link(self, payment_link_id: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/v1/payment_links/{payment_link_id}")
+
+    async def find_payment_links(self, reference_id: str) -> Dict[str, Any]:
+        """Payment links created with a reference_id, as {"payment_links": [...]}"""
+        return await self.request("GET", f"/v1/payment_links?reference_id={quote(reference_id)}")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
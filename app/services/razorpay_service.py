@@ -1,15 +1,22 @@
+import hashlib
+import hmac
 import os
+import re
 import razorpay
 from dotenv import load_dotenv
 from typing import Dict, Any, Optional
 import json
 
+from app.services.razorpay_client import RazorpayClient
+
 # Load environment variables
 load_dotenv()
 
 # Razorpay configuration
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+# Secret set on the webhook in the Razorpay dashboard; webhooks are rejected without it
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
 
 # Validate required environment variables
 if not RAZORPAY_KEY_ID:
@@ -20,6 +27,15 @@ if not RAZORPAY_KEY_SECRET:
 # Initialize Razorpay client
 client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 
+# Non-blocking client for the API's async routes
+api = RazorpayClient(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+
+# How Razorpay describes a payment link whose reference_id is already taken
+DUPLICATE_REFERENCE_PATTERN = re.compile(r"reference[ _]id.*(already|exist|duplicate)", re.IGNORECASE)
+
+# Payment links that can no longer be paid
+DEAD_LINK_STATUSES = {"cancelled", "expired"}
+
 def create_order(amount: float, currency: str = "INR", receipt: Optional[str] = None, notes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
     Create a new Razorpay order
@@ -53,13 +69,50 @@ def create_order(amount: float, currency: str = "INR", receipt: Optional[str] =
     except Exception as e:
         return {"error": str(e)}
 
+def payment_link_data(amount: float, customer_name: str, customer_email: str,
+                      customer_phone: str, description: str,
+                      callback_url: Optional[str] = None,
+                      callback_method: str = "get",
+                      reference_id: Optional[str] = None) -> Dict[str, Any]:
+    """Request body of a payment link creation (see create_payment_link for the arguments)"""
+    # Convert amount to paise
+    amount_in_paise = int(amount * 100)
+    
+    data = {
+        "amount": amount_in_paise,
+        "currency": "INR",
+        "accept_partial": False,
+        "description": description,
+        "customer": {
+            "name": customer_name,
+            "email": customer_email,
+            "contact": customer_phone
+        },
+        "notify": {
+            "sms": True,
+            "email": True
+        },
+        "reminder_enable": True,
+    }
+    
+    if callback_url:
+        data["callback_url"] = callback_url
+        data["callback_method"] = callback_method
+    if reference_id:
+        data["reference_id"] = reference_id
+    return data
+
 def create_payment_link(amount: float, customer_name: str, customer_email: str, 
                        customer_phone: str, description: str, 
                        callback_url: Optional[str] = None, 
-                       callback_method: str = "get") -> Dict[str, Any]:
+                       callback_method: str = "get",
+                       reference_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Create a payment link that can be shared with customers
     
+    Blocks for the whole HTTPS round trip; async code should use
+    create_payment_link_async.
+    
     Args:
         amount: Amount in INR
         customer_name: Name of the customer
@@ -68,40 +121,55 @@ def create_payment_link(amount: float, customer_name: str, customer_email: str,
         description: Description of the payment
         callback_url: URL to redirect after payment
         callback_method: HTTP method for callback
+        reference_id: Our id for the link (the payment id); Razorpay rejects
+            a second link with the same one, and webhooks carry it back
         
     Returns:
         Payment link details
     """
     try:
-        # Convert amount to paise
-        amount_in_paise = int(amount * 100)
-        
-        data = {
-            "amount": amount_in_paise,
-            "currency": "INR",
-            "accept_partial": False,
-            "description": description,
-            "customer": {
-                "name": customer_name,
-                "email": customer_email,
-                "contact": customer_phone
-            },
-            "notify": {
-                "sms": True,
-                "email": True
-            },
-            "reminder_enable": True,
-        }
-        
-        if callback_url:
-            data["callback_url"] = callback_url
-            data["callback_method"] = callback_method
-            
+        data = payment_link_data(amount, customer_name, customer_email, customer_phone, description,
+                                 callback_url, callback_method, reference_id)
         payment_link = client.payment_link.create(data=data)
         return payment_link
     except Exception as e:
         return {"error": str(e)}
 
+async def create_payment_link_async(amount: float, customer_name: str, customer_email: str,
+                                    customer_phone: str, description: str,
+                                    callback_url: Optional[str] = None,
+                                    callback_method: str = "get",
+                                    reference_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    create_payment_link for async routes, without blocking the event loop
+    
+    Goes through the shared RazorpayClient (connection reuse, timeouts,
+    retries and circuit breaker). Returns the payment link details, or a
+    dict with an "error" key.
+    
+    A retried creation may already have gone through, and Razorpay then
+    rejects the duplicate reference_id with a 400. In that case the live
+    link already created for the reference_id is returned instead; if that
+    link was cancelled or has expired, the duplicate error is returned.
+    """
+    data = payment_link_data(amount, customer_name, customer_email, customer_phone, description,
+                             callback_url, callback_method, reference_id)
+    result = await api.create_payment_link(data)
+    if reference_id and _is_duplicate_reference(result):
+        existing = await api.find_payment_links(reference_id)
+        links = [
+            link for link in existing.get("payment_links") or []
+            if link.get("status") not in DEAD_LINK_STATUSES
+        ]
+        if links:
+            return max(links, key=lambda link: link.get("created_at") or 0)
+    return result
+
+def _is_duplicate_reference(result: Dict[str, Any]) -> bool:
+    if result.get("status_code") != 400:
+        return False
+    return result.get("field") == "reference_id" or bool(DUPLICATE_REFERENCE_PATTERN.search(result.get("error") or ""))
+
 def verify_payment_signature(payment_id: str, order_id: str, signature: str) -> bool:
     """
     Verify the payment signature to confirm payment authenticity
@@ -124,6 +192,22 @@ def verify_payment_signature(payment_id: str, order_id: str, signature: str) ->
     except Exception:
         return False
 
+def verify_webhook_signature(body: bytes, signature: Optional[str]) -> bool:
+    """
+    Verify a webhook's X-Razorpay-Signature header
+    
+    Args:
+        body: Raw request body, exactly as received
+        signature: Hex HMAC-SHA256 of the body with the webhook secret
+        
+    Returns:
+        True if the signature is valid, False otherwise (or if no secret is configured)
+    """
+    if not RAZORPAY_WEBHOOK_SECRET or not signature:
+        return False
+    expected = hmac.new(RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
 def get_payment_details(payment_id: str) -> Dict[str, Any]:
     """
     Get details of a payment
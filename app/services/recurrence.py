@@ -0,0 +1,86 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
+
+from dateutil.rrule import rrule, rrulestr
+
+from app.models import ReminderFrequency
+from app.services.timestamps import naive_utc
+
+RULE_FREQUENCIES = {
+    ReminderFrequency.DAILY.value: "DAILY",
+    ReminderFrequency.WEEKLY.value: "WEEKLY",
+    ReminderFrequency.MONTHLY.value: "MONTHLY",
+}
+
+def _rule_time(value: datetime) -> str:
+    return naive_utc(value).strftime("%Y%m%dT%H%M%S")
+
+def build_rule(frequency: str, dtstart: datetime, until: Optional[datetime] = None) -> Optional[str]:
+    """
+    Recurrence rule (RFC 5545 DTSTART + RRULE) for a reminder frequency
+
+    Monthly rules keep the day of month of dtstart and clamp it to the last
+    day of shorter months (the 31st becomes Feb 28/29, Apr 30, ...).
+
+    Args:
+        frequency: One of the ReminderFrequency values
+        dtstart: First occurrence, naive UTC
+        until: Last possible occurrence, naive UTC
+
+    Returns:
+        The rule text, or None for one-time reminders
+    """
+    freq = RULE_FREQUENCIES.get(frequency)
+    if freq is None:
+        return None
+    dtstart = naive_utc(dtstart)
+    parts = [f"FREQ={freq}"]
+    if freq == "MONTHLY" and dtstart.day > 28:
+        days = ",".join(str(day) for day in range(28, dtstart.day + 1))
+        parts.append(f"BYMONTHDAY={days};BYSETPOS=-1")
+    if until is not None:
+        parts.append(f"UNTIL={_rule_time(until)}")
+    return f"DTSTART:{_rule_time(dtstart)}\nRRULE:{';'.join(parts)}"
+
+@lru_cache(maxsize=4096)
+def parse_rule(rule_text: str) -> rrule:
+    """Parsed rule; rules are immutable strings, so parsing is cached"""
+    return rrulestr(rule_text)
+
+def reminder_rule(recurrence_rule: Optional[str], frequency: Optional[str], send_time: Optional[datetime],
+                  recurring_end_date: Optional[datetime]) -> Optional[str]:
+    """
+    A reminder's recurrence rule
+
+    Recurring reminders created before rules were stored are anchored at
+    their current send_time.
+    """
+    if recurrence_rule:
+        return recurrence_rule
+    if send_time is None:
+        return None
+    return build_rule(frequency, send_time, recurring_end_date)
+
+def next_occurrence(rule_text: Optional[str], after: datetime) -> Optional[datetime]:
+    """First occurrence strictly after `after`, or None once the rule is exhausted"""
+    if not rule_text:
+        return None
+    return parse_rule(rule_text).after(after)
+
+def occurrences(rule_text: str, start: datetime, count: Optional[int] = None,
+                end: Optional[datetime] = None) -> List[datetime]:
+    """
+    Occurrences from `start` (inclusive), up to `count` of them and/or up to `end` (inclusive)
+
+    At least one of count and end must be given.
+    """
+    rule = parse_rule(rule_text)
+    result = []
+    for occurrence in rule.xafter(start, inc=True):
+        if end is not None and occurrence > end:
+            break
+        result.append(occurrence)
+        if count is not None and len(result) >= count:
+            break
+    return result
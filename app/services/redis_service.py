@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared with Celery, which uses the same instance as broker and result backend
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+def get_redis() -> redis.Redis:
+    """Process-wide synchronous Redis client"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Process-wide asyncio Redis client for the API's event loop
+
+    Code that runs its own short-lived event loop (asyncio.run in a Celery
+    task) must create its own client with aioredis.from_url instead.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(REDIS_URL)
+    return _async_client
@@ -0,0 +1,96 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Template variable pattern: {variable_name}
+TEMPLATE_PATTERN = re.compile(r'\{([a-zA-Z0-9_]+)\}')
+
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "1024"))
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal text and variable slots
+
+    Placeholders without a value are left in the output as written, the same
+    as the previous str.replace implementation did.
+    """
+    __slots__ = ("parts", "slots", "variables")
+
+    def __init__(self, content: str):
+        # re.split with a capture group alternates literal, name, literal, ...
+        pieces = TEMPLATE_PATTERN.split(content)
+        self.parts: List[str] = []
+        self.slots: List[Tuple[int, str]] = []
+        for index, piece in enumerate(pieces):
+            if index % 2:
+                self.slots.append((len(self.parts), piece))
+                self.parts.append(f"{{{piece}}}")
+            elif piece:
+                self.parts.append(piece)
+        self.variables: List[str] = list(dict.fromkeys(name for _, name in self.slots))
+
+    def render(self, variables: Dict[str, str]) -> str:
+        """Fill in the variables with a single join"""
+        parts = self.parts.copy()
+        for index, name in self.slots:
+            value = variables.get(name)
+            if value is not None:
+                parts[index] = str(value)
+        return "".join(parts)
+
+    def render_many(self, variables_list: Iterable[Dict[str, str]]) -> List[str]:
+        """Render the template once per variables dict, e.g. for every recipient of a campaign"""
+        render = self.render
+        return [render(variables) for variables in variables_list]
+
+class TemplateCache:
+    """Thread-safe LRU of compiled templates keyed by (template id, version)"""
+
+    def __init__(self, maxsize: int = TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template_id: Hashable, version: int, content: str) -> CompiledTemplate:
+        """
+        Compiled template for this id and version, compiling `content` on a miss
+
+        A new version of a template gets a new key; the old one ages out.
+        """
+        key = (template_id, version)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+        compiled = CompiledTemplate(content)
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+template_cache = TemplateCache()
+
+def compile_template(content: str, template_id: Optional[Hashable] = None, version: int = 0) -> CompiledTemplate:
+    """Compile a template, through the LRU when it has an id"""
+    if template_id is None:
+        return CompiledTemplate(content)
+    return template_cache.get(template_id, version, content)
+
+def render_template(content: str, variables: Dict[str, str], template_id: Optional[Hashable] = None,
+                    version: int = 0) -> str:
+    """Render a template with one set of variables"""
+    return compile_template(content, template_id, version).render(variables)
+
+def render_many(content: str, variables_list: Iterable[Dict[str, str]], template_id: Optional[Hashable] = None,
+                version: int = 0) -> List[str]:
+    """Render a template for many variable sets, compiling it only once"""
+    return compile_template(content, template_id, version).render_many(variables_list)
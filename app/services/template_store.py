@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import MessageTemplate
+from app.services import cache
+from app.services.cache import TEMPLATES_CACHE
+from app.services.template_engine import CompiledTemplate, compile_template
+
+# Templates kept per process, least recently used dropped first
+TEMPLATE_STORE_CACHE_SIZE = int(os.getenv("TEMPLATE_STORE_CACHE_SIZE", "5000"))
+
+class TemplateEntry(NamedTuple):
+    id: str
+    owner_id: Optional[int]
+    version: int
+    content: str
+    variables: List[str]
+
+    def compiled(self) -> CompiledTemplate:
+        """The compiled form, shared by every render of this id and version"""
+        return compile_template(self.content, self.id, self.version)
+
+    def visible_to(self, owner_id: int) -> bool:
+        return self.owner_id is None or self.owner_id == owner_id
+
+class TemplateStoreCache:
+    """
+    Thread-safe LRU of templates, each stored with the owner's TEMPLATES_CACHE
+    version it was read or written under
+    """
+
+    def __init__(self, maxsize: int = TEMPLATE_STORE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Optional[str], TemplateEntry]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template_id: str) -> Optional[Tuple[Optional[str], TemplateEntry]]:
+        with self._lock:
+            cached = self._entries.get(template_id)
+            if cached is not None:
+                self._entries.move_to_end(template_id)
+            return cached
+
+    def put(self, entry: TemplateEntry, owner_version: Optional[str]):
+        with self._lock:
+            self._entries[entry.id] = (owner_version, entry)
+            self._entries.move_to_end(entry.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, template_id: str):
+        with self._lock:
+            self._entries.pop(template_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+template_store_cache = TemplateStoreCache()
+
+def _entry(template: MessageTemplate) -> TemplateEntry:
+    return TemplateEntry(
+        template.id, template.owner_id, template.version or 1, template.content, template.variables or []
+    )
+
+def visible_templates_query(owner_id: int):
+    """Built-in templates plus the owner's own"""
+    return select(MessageTemplate).where(
+        or_(MessageTemplate.owner_id.is_(None), MessageTemplate.owner_id == owner_id)
+    )
+
+async def _is_current(owner_version: Optional[str], entry: TemplateEntry) -> bool:
+    # Built-in templates can't be edited through the API, only by a deploy
+    if entry.owner_id is None:
+        return True
+    if owner_version is None:
+        return False
+    return await cache.current_version(TEMPLATES_CACHE, entry.owner_id) == owner_version
+
+async def get_template(db: AsyncSession, template_id: str, owner_id: int) -> Optional[TemplateEntry]:
+    """
+    Look up a template on the render path
+
+    Served from the process-local copy as long as the owner's templates
+    version in Redis (bumped by every template write) is the one it was
+    stored under, which costs a single GET. Otherwise the row is re-read by
+    primary key. Its version keys the compiled template cache, so a template
+    is only recompiled when its content actually changed.
+
+    Returns:
+        The template, or None if it does not exist or belongs to someone else
+    """
+    cached = template_store_cache.get(template_id)
+    if cached is not None and await _is_current(*cached):
+        entry = cached[1]
+    else:
+        # Read before the row, so a write committed in between is caught on the next lookup.
+        # Only built-in templates and the owner's own are ever returned.
+        owner_version = await cache.current_version(TEMPLATES_CACHE, owner_id)
+        template = await db.get(MessageTemplate, template_id)
+        if template is None:
+            forget_template(template_id)
+            return None
+        entry = _entry(template)
+        if entry.owner_id is None or entry.owner_id == owner_id:
+            template_store_cache.put(entry, owner_version)
+    return entry if entry.visible_to(owner_id) else None
+
+def remember_template(template: MessageTemplate, owner_version: Optional[str]):
+    """
+    Store a template written in this process
+
+    Args:
+        template: The committed template
+        owner_version: What cache.invalidate(TEMPLATES_CACHE, ...) returned for the write
+    """
+    template_store_cache.put(_entry(template), owner_version)
+
+def forget_template(template_id: str):
+    template_store_cache.forget(template_id)
@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; aware values are converted, naive ones taken as UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
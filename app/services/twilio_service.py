@@ -1,15 +1,32 @@
 from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+import asyncio
+import aiohttp
 import os
+import time
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.services.rate_limiter import Bucket, TokenBucketLimiter, backoff_delay
+from app.services.redis_service import REDIS_URL, get_redis
 
-# Load environment variables from .env file
 load_dotenv()
 
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
 
-# Validate required environment variables
+# Batch sending configuration
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "https://api.twilio.com")
+TWILIO_MAX_IN_FLIGHT = int(os.getenv("TWILIO_MAX_IN_FLIGHT", "20"))
+TWILIO_REQUEST_TIMEOUT = float(os.getenv("TWILIO_REQUEST_TIMEOUT", "15"))
+
+# Outbound rate limits, shared by all workers through Redis
+TWILIO_ACCOUNT_RATE_PER_SECOND = float(os.getenv("TWILIO_ACCOUNT_RATE_PER_SECOND", "100"))
+TWILIO_NUMBER_RATE_PER_SECOND = float(os.getenv("TWILIO_NUMBER_RATE_PER_SECOND", "80"))
+TWILIO_RATE_LIMIT_MAX_QUEUE_SECONDS = float(os.getenv("TWILIO_RATE_LIMIT_MAX_QUEUE_SECONDS", "30"))
+TWILIO_MAX_RETRIES = int(os.getenv("TWILIO_MAX_RETRIES", "3"))
+
 if not TWILIO_ACCOUNT_SID:
     raise ValueError("TWILIO_ACCOUNT_SID environment variable is required")
 if not TWILIO_AUTH_TOKEN:
@@ -19,14 +36,125 @@ if not TWILIO_WHATSAPP_NUMBER:
 
 client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
-def send_whatsapp_message(to_number: str, message: str):
-    """Send WhatsApp message via Twilio"""
+MESSAGES_URL = f"{TWILIO_API_BASE}/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+
+TWILIO_RATE_LIMIT_BUCKETS = [
+    Bucket(f"ratelimit:twilio:account:{TWILIO_ACCOUNT_SID}", TWILIO_ACCOUNT_RATE_PER_SECOND, TWILIO_ACCOUNT_RATE_PER_SECOND),
+    Bucket(f"ratelimit:twilio:number:{TWILIO_WHATSAPP_NUMBER}", TWILIO_NUMBER_RATE_PER_SECOND, TWILIO_NUMBER_RATE_PER_SECOND),
+]
+
+_limiter: Optional[TokenBucketLimiter] = None
+
+def get_rate_limiter() -> TokenBucketLimiter:
+    """Rate limiter for synchronous sends, on the shared Redis client"""
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucketLimiter(get_redis(), TWILIO_RATE_LIMIT_BUCKETS, TWILIO_RATE_LIMIT_MAX_QUEUE_SECONDS)
+    return _limiter
+
+def _retry_after(response: aiohttp.ClientResponse, attempt: int) -> float:
+    """Delay before retrying a throttled request: Retry-After if given, else jittered backoff"""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return backoff_delay(attempt)
+
+async def _json_or_none(response: aiohttp.ClientResponse) -> Any:
+    """The decoded body, or None if it isn't JSON"""
+    try:
+        return await response.json(content_type=None)
+    except ValueError:
+        return None
+
+def send_whatsapp_message(to_number: str, message: str, status_callback: Optional[str] = None):
+    """
+    Send WhatsApp message via Twilio
+
+    Blocks while the rate limiter queues the send and between throttled
+    retries, so call it from a task or thread, never on the event loop.
+    """
+    limiter = get_rate_limiter()
+    options = {"status_callback": status_callback} if status_callback else {}
+    for attempt in range(TWILIO_MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            msg = client.messages.create(
+                from_=TWILIO_WHATSAPP_NUMBER,
+                body=message,
+                to=f"whatsapp:{to_number}",
+                **options
+            )
+            return {"sid": msg.sid, "status": msg.status}
+        except TwilioRestException as e:
+            if e.status == 429 and attempt < TWILIO_MAX_RETRIES:
+                # TwilioRestException doesn't carry the response headers, so
+                # Retry-After can't be honoured here; jittered backoff instead
+                time.sleep(backoff_delay(attempt))
+                continue
+            return {"error": str(e), "status_code": e.status}
+        except Exception as e:
+            return {"error": str(e)}
+
+async def _send_whatsapp_message_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                       limiter: TokenBucketLimiter, to_number: str, message: str,
+                                       status_callback: Optional[str] = None) -> Dict[str, Any]:
+    """Send one WhatsApp message over a shared HTTP session"""
+    data = {
+        "From": TWILIO_WHATSAPP_NUMBER,
+        "To": f"whatsapp:{to_number}",
+        "Body": message
+    }
+    if status_callback:
+        data["StatusCallback"] = status_callback
+    for attempt in range(TWILIO_MAX_RETRIES + 1):
+        # Reserve a send slot before taking a connection, so queued sends don't hold one
+        await limiter.acquire_async()
+        async with semaphore:
+            try:
+                async with session.post(MESSAGES_URL, data=data) as response:
+                    # Before decoding: throttling answers from Twilio's edge may not be JSON
+                    if response.status == 429 and attempt < TWILIO_MAX_RETRIES:
+                        delay = _retry_after(response, attempt)
+                    elif response.status >= 400:
+                        payload = await _json_or_none(response)
+                        message = payload.get("message") if isinstance(payload, dict) else None
+                        return {
+                            "to": to_number,
+                            "error": message or f"HTTP {response.status}",
+                            "status_code": response.status
+                        }
+                    else:
+                        payload = await response.json(content_type=None)
+                        return {"to": to_number, "sid": payload["sid"], "status": payload["status"]}
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as e:
+                return {"to": to_number, "error": str(e) or e.__class__.__name__}
+        await asyncio.sleep(delay)
+
+async def send_whatsapp_messages(messages: Sequence[Tuple[str, ...]],
+                                 max_in_flight: int = TWILIO_MAX_IN_FLIGHT) -> List[Dict[str, Any]]:
+    """
+    Send many WhatsApp messages concurrently via the Twilio REST API
+    
+    Args:
+        messages: (to_number, message) or (to_number, message, status_callback) tuples
+        max_in_flight: Maximum number of concurrent requests to Twilio
+        
+    Returns:
+        One result per message, in the same order, with either sid/status or error
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+    # A client bound to this call's event loop (Celery tasks run one loop per batch)
+    redis_client = aioredis.from_url(REDIS_URL)
+    limiter = TokenBucketLimiter(redis_client, TWILIO_RATE_LIMIT_BUCKETS, TWILIO_RATE_LIMIT_MAX_QUEUE_SECONDS)
     try:
-        msg = client.messages.create(
-            from_=TWILIO_WHATSAPP_NUMBER,
-            body=message,
-            to=f"whatsapp:{to_number}"
-        )
-        return {"sid": msg.sid, "status": msg.status}
-    except Exception as e:
-        return {"error": str(e)}
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_in_flight),
+            auth=aiohttp.BasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+            timeout=aiohttp.ClientTimeout(total=TWILIO_REQUEST_TIMEOUT)
+        ) as session:
+            return await asyncio.gather(*(
+                _send_whatsapp_message_async(session, semaphore, limiter, *message)
+                for message in messages
+            ))
+    finally:
+        await redis_client.aclose()
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import Customer, Payment, PaymentStatus, WebhookEvent, WebhookEventStatus
+from app.services.payment_rollups import rollup_batch_statements, rollup_entry
+
+logger = logging.getLogger(__name__)
+
+# Errors stored on a failed event are cut to this length
+WEBHOOK_ERROR_MAX_LENGTH = 2000
+
+def webhook_event_id(event_id: Optional[str], body: bytes) -> str:
+    """Razorpay's event id, or a digest of the body for deliveries without one"""
+    return event_id or f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+def store_webhook_event(event_id: str, payload: Dict[str, Any]):
+    """INSERT of a received event into the inbox; a redelivered event_id is a no-op"""
+    return insert(WebhookEvent).values(
+        event_id=event_id,
+        event=str(payload.get("event") or ""),
+        payload=payload,
+        status=WebhookEventStatus.PENDING.value,
+        attempts=0,
+        received_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=[WebhookEvent.event_id])
+
+def claim_webhook_events(db: Session, limit: int) -> List[WebhookEvent]:
+    """
+    Lock the oldest pending events
+
+    FOR UPDATE SKIP LOCKED lets several workers process disjoint batches.
+    The locks are held until the caller commits.
+    """
+    return db.scalars(
+        select(WebhookEvent)
+        .where(WebhookEvent.status == WebhookEventStatus.PENDING.value)
+        .order_by(WebhookEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+def _paid_link(payload: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+    """(our payment id, Razorpay payment id) of a payment_link.paid event"""
+    body = payload.get("payload") or {}
+    link = body.get("payment_link") or {}
+    link = link.get("entity", link)
+    payment = body.get("payment") or {}
+    payment = payment.get("entity", payment)
+    reference_id = str(link.get("reference_id") or "")
+    razorpay_payment_id = link.get("razorpay_payment_id") or payment.get("id")
+    return (int(reference_id) if reference_id.isdigit() else None), razorpay_payment_id
+
+def _apply_events(db: Session, events: List[WebhookEvent]) -> Tuple[Set[int], List[list]]:
+    """
+    Apply events to payments, with one locking query for the whole batch
+
+    Only payments that actually change status are updated and confirmed, so
+    an event that is applied twice has no further effect.
+    """
+    paid: Dict[int, Optional[str]] = {}
+    for event in events:
+        if event.event == "payment_link.paid":
+            payment_id, razorpay_payment_id = _paid_link(event.payload)
+            if payment_id is not None:
+                paid[payment_id] = razorpay_payment_id
+
+    owner_ids: Set[int] = set()
+    confirmations: List[list] = []
+    rollup_changes = []
+    if paid:
+        # Locked in id order, so concurrent batches can't deadlock
+        rows = db.execute(
+            select(Payment, Customer.phone)
+            .outerjoin(Customer, Customer.id == Payment.customer_id)
+            .where(Payment.id.in_(paid))
+            .order_by(Payment.id)
+            .with_for_update(of=Payment)
+        ).all()
+        for payment, phone in rows:
+            if payment.status == PaymentStatus.COMPLETED.value:
+                continue
+            before = rollup_entry(payment)
+            payment.status = PaymentStatus.COMPLETED.value
+            payment.razorpay_payment_id = paid[payment.id]
+            rollup_changes.append((before, rollup_entry(payment)))
+            owner_ids.add(payment.owner_id)
+            if phone:
+                message = f"Thank you! Your payment of ₹{payment.amount} for {payment.description} has been received."
+                confirmations.append([phone, message])
+        # One upsert per rollup row, in key order, so concurrent batches can't deadlock
+        for statement in rollup_batch_statements(rollup_changes):
+            db.execute(statement)
+
+    # Events we don't act on are marked processed as well
+    db.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id.in_([event.id for event in events]))
+        .values(
+            status=WebhookEventStatus.PROCESSED.value,
+            attempts=WebhookEvent.attempts + 1,
+            error=None,
+            processed_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.flush()
+    return owner_ids, confirmations
+
+def process_webhook_batch(db: Session, events: List[WebhookEvent]) -> Tuple[Set[int], List[list]]:
+    """
+    Apply a batch of claimed events in the caller's transaction
+
+    The batch is applied as a whole inside a savepoint. If that fails, the
+    events are retried one at a time, and the ones that still fail are
+    marked failed with their error instead of blocking the inbox.
+
+    Returns:
+        Owners whose payment stats changed, and [phone, message]
+        confirmations to send once the transaction has been committed
+    """
+    try:
+        with db.begin_nested():
+            return _apply_events(db, events)
+    except Exception:
+        logger.exception("Webhook batch of %d events failed, retrying one by one", len(events))
+
+    owner_ids: Set[int] = set()
+    confirmations: List[list] = []
+    for event in events:
+        try:
+            with db.begin_nested():
+                owners, sends = _apply_events(db, [event])
+            owner_ids |= owners
+            confirmations.extend(sends)
+        except Exception as e:
+            logger.exception("Webhook event %s failed", event.event_id)
+            db.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id == event.id)
+                .values(
+                    status=WebhookEventStatus.FAILED.value,
+                    attempts=WebhookEvent.attempts + 1,
+                    error=str(e)[:WEBHOOK_ERROR_MAX_LENGTH],
+                    processed_at=datetime.utcnow(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+    return owner_ids, confirmations
+
+def requeue_webhook_events(db: Session, event_ids: Optional[List[str]] = None, status: Optional[str] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """
+    Put stored events back in the inbox so the processor applies them again
+
+    Safe for events that were already processed: applying an event twice
+    has no further effect. Nothing is committed here.
+
+    Returns:
+        Number of events requeued
+    """
+    query = update(WebhookEvent).values(status=WebhookEventStatus.PENDING.value, processed_at=None)
+    if event_ids:
+        query = query.where(WebhookEvent.event_id.in_(event_ids))
+    if status:
+        query = query.where(WebhookEvent.status == status)
+    if since:
+        query = query.where(WebhookEvent.received_at >= since)
+    if until:
+        query = query.where(WebhookEvent.received_at < until)
+    return db.execute(query.execution_options(synchronize_session=False)).rowcount
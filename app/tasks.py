@@ -1,14 +1,396 @@
-from celery import Celery
-from app.services.twilio_service import send_whatsapp_message
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List
+
+from celery import Celery, group
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Reminder, ReminderStatus, Customer, ImportJob, ImportJobStatus
+from app.services.customer_import import import_customers_csv
+from app.services.delivery_status import (
+    STATUS_CALLBACK_QUEUE, apply_status_updates, callbacks_to_updates,
+    send_results_to_updates, status_callback_url
+)
+from app.services.cache import PAYMENT_STATS_CACHE, invalidate_sync
+from app.services.recurrence import next_occurrence, reminder_rule
+from app.services.redis_service import REDIS_URL, get_redis
+from app.services.twilio_service import send_whatsapp_message, send_whatsapp_messages, TWILIO_MAX_IN_FLIGHT
+from app.services.webhook_inbox import claim_webhook_events, process_webhook_batch
+
+# Postgres NOTIFY channel the reminder scheduler listens on
+REMINDER_CHANGES_CHANNEL = "reminder_changes"
+
+# Reminder dispatch configuration
+DISPATCH_INTERVAL_SECONDS = float(os.getenv("REMINDER_DISPATCH_INTERVAL_SECONDS", "15"))
+DISPATCH_BATCH_SIZE = int(os.getenv("REMINDER_DISPATCH_BATCH_SIZE", "500"))
+DISPATCH_MAX_BATCHES = int(os.getenv("REMINDER_DISPATCH_MAX_BATCHES", "20"))
+# Messages per send_whatsapp_batch_task
+SEND_BATCH_SIZE = int(os.getenv("WHATSAPP_SEND_BATCH_SIZE", "100"))
+
+# Delivery status ingestion configuration
+STATUS_INGEST_INTERVAL_SECONDS = float(os.getenv("STATUS_INGEST_INTERVAL_SECONDS", "2"))
+STATUS_INGEST_BATCH_SIZE = int(os.getenv("STATUS_INGEST_BATCH_SIZE", "5000"))
+
+# Razorpay webhook inbox processing configuration
+WEBHOOK_PROCESS_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_PROCESS_INTERVAL_SECONDS", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_MAX_BATCHES = int(os.getenv("WEBHOOK_MAX_BATCHES", "20"))
+
+# Customer import configuration: a running job without progress for this long
+# is taken to have lost its worker and is marked failed
+IMPORT_JOB_STALE_MINUTES = float(os.getenv("IMPORT_JOB_STALE_MINUTES", "30"))
+IMPORT_JOB_STALE_CHECK_INTERVAL_SECONDS = float(os.getenv("IMPORT_JOB_STALE_CHECK_INTERVAL_SECONDS", "300"))
 
 celery_app = Celery(
     "greentick",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0"
+    broker=REDIS_URL,
+    backend=REDIS_URL
 )
 
+celery_app.conf.beat_schedule = {
+    "dispatch-due-reminders": {
+        "task": "app.tasks.dispatch_due_reminders",
+        "schedule": DISPATCH_INTERVAL_SECONDS,
+    },
+    "ingest-delivery-statuses": {
+        "task": "app.tasks.ingest_delivery_statuses",
+        "schedule": STATUS_INGEST_INTERVAL_SECONDS,
+    },
+    "process-webhook-events": {
+        "task": "app.tasks.process_webhook_events",
+        "schedule": WEBHOOK_PROCESS_INTERVAL_SECONDS,
+    },
+    "expire-stale-import-jobs": {
+        "task": "app.tasks.expire_stale_import_jobs",
+        "schedule": IMPORT_JOB_STALE_CHECK_INTERVAL_SECONDS,
+    },
+}
+
+def record_send_results(reminder_ids: List[Optional[int]], results: List[dict]):
+    """Store message SIDs and send failures on the reminders that were sent"""
+    updates = send_results_to_updates(reminder_ids, results)
+    if not updates:
+        return
+    db = SessionLocal()
+    try:
+        apply_status_updates(db, updates)
+        db.commit()
+    finally:
+        db.close()
+
 @celery_app.task
-def send_reminder_task(to_number: str, message: str):
+def send_reminder_task(to_number: str, message: str, reminder_id: Optional[int] = None):
     """Background task to send WhatsApp reminder"""
-    result = send_whatsapp_message(to_number, message)
+    result = send_whatsapp_message(to_number, message, status_callback=status_callback_url(reminder_id))
+    record_send_results([reminder_id], [result])
     return result
+
+@celery_app.task
+def send_whatsapp_batch_task(messages: List[list], max_in_flight: int = TWILIO_MAX_IN_FLIGHT):
+    """
+    Background task to send a batch of WhatsApp messages concurrently
+
+    Args:
+        messages: [to_number, message] pairs, or [to_number, message, reminder_id]
+            to track delivery of a reminder
+        max_in_flight: Maximum number of concurrent requests to Twilio
+
+    Returns:
+        Per-recipient results, in the same order as messages
+    """
+    reminder_ids = [item[2] if len(item) > 2 else None for item in messages]
+    sends = [
+        (item[0], item[1], status_callback_url(reminder_id))
+        for item, reminder_id in zip(messages, reminder_ids)
+    ]
+    results = asyncio.run(send_whatsapp_messages(sends, max_in_flight=max_in_flight))
+    record_send_results(reminder_ids, results)
+    return results
+
+def claim_due_reminders(db: Session, now: datetime, limit: int, owner_id: Optional[int] = None,
+                        reminder_ids: Optional[List[int]] = None):
+    """
+    Lock a batch of due reminders and mark them as queued
+
+    Rows are selected with FOR UPDATE SKIP LOCKED, so concurrent dispatchers
+    claim disjoint batches instead of blocking on each other. Recurring
+    reminders are not queued but stay pending, with send_time advanced to
+    their next occurrence after now (and published to the scheduler); only
+    their last occurrence is queued. Nothing is committed here.
+
+    Args:
+        db: Database session
+        now: Reminders with send_time <= now are due
+        limit: Maximum number of reminders to claim
+        owner_id: Only claim reminders of this user's customers
+        reminder_ids: Only claim reminders with these ids
+
+    Returns:
+        Claimed rows with reminder fields and the customer's phone
+    """
+    query = (
+        select(
+            Reminder.id,
+            Reminder.message,
+            Reminder.send_time,
+            Reminder.frequency,
+            Reminder.recurring_end_date,
+            Reminder.recurrence_rule,
+            Customer.phone,
+        )
+        .join(Customer, Customer.id == Reminder.customer_id)
+        .where(Reminder.status == ReminderStatus.PENDING.value, Reminder.send_time <= now)
+        .order_by(Reminder.send_time)
+        .limit(limit)
+        .with_for_update(of=Reminder, skip_locked=True)
+    )
+    if owner_id is not None:
+        query = query.where(Customer.owner_id == owner_id)
+    if reminder_ids is not None:
+        query = query.where(Reminder.id.in_(reminder_ids))
+
+    rows = db.execute(query).all()
+    if not rows:
+        return []
+
+    # Expand recurrence rules lazily: one row per reminder, however often it repeats
+    advanced = []
+    finished = []
+    for row in rows:
+        rule = reminder_rule(row.recurrence_rule, row.frequency, row.send_time, row.recurring_end_date)
+        next_time = next_occurrence(rule, max(row.send_time, now))
+        if next_time:
+            advanced.append({"id": row.id, "send_time": next_time, "recurrence_rule": rule})
+        else:
+            finished.append(row.id)
+
+    if finished:
+        db.execute(
+            update(Reminder)
+            .where(Reminder.id.in_(finished))
+            .values(status=ReminderStatus.QUEUED.value)
+            .execution_options(synchronize_session=False)
+        )
+    if advanced:
+        # ORM bulk UPDATE by primary key, sent as one executemany
+        db.execute(update(Reminder), advanced)
+        # Tell the scheduler about the next occurrences, once this transaction commits
+        db.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {
+                "channel": REMINDER_CHANGES_CHANNEL,
+                "payloads": [
+                    json.dumps({"id": item["id"], "send_time": item["send_time"].isoformat()})
+                    for item in advanced
+                ],
+            }
+        )
+
+    return rows
+
+def enqueue_reminder_sends(rows):
+    """Enqueue claimed reminder rows as a group of batched send tasks"""
+    messages = [[row.phone, row.message, row.id] for row in rows]
+    return group(
+        send_whatsapp_batch_task.s(messages[i:i + SEND_BATCH_SIZE])
+        for i in range(0, len(messages), SEND_BATCH_SIZE)
+    ).apply_async()
+
+@celery_app.task
+def dispatch_due_reminders(owner_id: Optional[int] = None,
+                           batch_size: int = DISPATCH_BATCH_SIZE,
+                           max_batches: int = DISPATCH_MAX_BATCHES):
+    """
+    Periodic task (Celery Beat) that sends all due reminders across tenants
+
+    Each batch is claimed and committed in its own transaction, then enqueued
+    as a group of send tasks, so the work per run is bounded by
+    batch_size * max_batches regardless of how large the table grows.
+    """
+    dispatched = 0
+    for _ in range(max_batches):
+        db = SessionLocal()
+        try:
+            rows = claim_due_reminders(db, datetime.utcnow(), batch_size, owner_id=owner_id)
+            if not rows:
+                break
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        # Only once the claim is committed, so a failed commit can't leave sends behind
+        enqueue_reminder_sends(rows)
+        dispatched += len(rows)
+        if len(rows) < batch_size:
+            break
+    return {"dispatched": dispatched}
+
+@celery_app.task
+def import_customers_task(job_id: str):
+    """
+    Background task that imports an uploaded customers CSV for an ImportJob
+
+    The import runs in one transaction that also marks the job completed.
+    Progress is committed after every chunk through a separate session, so
+    it is visible to the polling endpoints while the import is running, and
+    its updated_at tells expire_stale_import_jobs the worker is still alive.
+    """
+    db = SessionLocal()
+    progress_db = SessionLocal()
+    try:
+        job = db.get(ImportJob, job_id)
+        if job is None or job.status != ImportJobStatus.QUEUED.value:
+            return None
+        file_path = job.file_path
+
+        progress_db.execute(
+            update(ImportJob).where(ImportJob.id == job_id)
+            .values(status=ImportJobStatus.RUNNING.value, started_at=datetime.utcnow())
+        )
+        progress_db.commit()
+
+        def on_progress(rows_processed: int, rows_failed: int):
+            progress_db.execute(
+                update(ImportJob).where(ImportJob.id == job_id)
+                .values(rows_processed=rows_processed, rows_failed=rows_failed)
+            )
+            progress_db.commit()
+
+        try:
+            with open(file_path, "rb") as f:
+                result = import_customers_csv(db, job.owner_id, f, on_progress=on_progress)
+
+            job.status = ImportJobStatus.COMPLETED.value
+            job.rows_processed = result["success_count"] + result["failed_count"]
+            job.rows_failed = result["failed_count"]
+            job.failed_rows = result["failed_rows"]
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            progress_db.execute(
+                update(ImportJob).where(ImportJob.id == job_id)
+                .values(status=ImportJobStatus.FAILED.value, error=str(e), finished_at=datetime.utcnow())
+            )
+            progress_db.commit()
+            raise
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        return {
+            "job_id": job_id,
+            "rows_processed": result["success_count"] + result["failed_count"],
+            "rows_failed": result["failed_count"]
+        }
+    finally:
+        db.close()
+        progress_db.close()
+
+@celery_app.task
+def expire_stale_import_jobs(stale_minutes: float = IMPORT_JOB_STALE_MINUTES):
+    """
+    Periodic task (Celery Beat) that fails import jobs whose worker died
+
+    A running job commits its progress (and so updated_at) after every
+    chunk; one that hasn't for stale_minutes is marked failed and its
+    uploaded file removed, instead of staying running forever.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    db = SessionLocal()
+    try:
+        expired = db.execute(
+            update(ImportJob)
+            .where(ImportJob.status == ImportJobStatus.RUNNING.value, ImportJob.updated_at < cutoff)
+            .values(
+                status=ImportJobStatus.FAILED.value,
+                error=f"No progress for {stale_minutes:g} minutes; the import worker stopped",
+                finished_at=datetime.utcnow()
+            )
+            .returning(ImportJob.id, ImportJob.file_path)
+        ).all()
+        db.commit()
+    finally:
+        db.close()
+
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    return {"expired": [job.id for job in expired]}
+
+@celery_app.task
+def ingest_delivery_statuses(batch_size: int = STATUS_INGEST_BATCH_SIZE):
+    """
+    Periodic task (Celery Beat) that applies buffered Twilio status callbacks
+
+    Callbacks are popped from the Redis buffer in batches and applied with
+    one UPDATE per batch; the status ranking makes replays harmless.
+    """
+    redis_client = get_redis()
+    applied = 0
+    while True:
+        raw = redis_client.rpop(STATUS_CALLBACK_QUEUE, batch_size) or []
+        if not raw:
+            break
+        callbacks = []
+        for item in raw:
+            try:
+                callbacks.append(json.loads(item))
+            except ValueError:
+                continue
+
+        db = SessionLocal()
+        try:
+            applied += apply_status_updates(db, callbacks_to_updates(callbacks))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back so the next run retries it
+            redis_client.rpush(STATUS_CALLBACK_QUEUE, *reversed(raw))
+            raise
+        finally:
+            db.close()
+        if len(raw) < batch_size:
+            break
+    return {"applied": applied}
+
+@celery_app.task
+def process_webhook_events(batch_size: int = WEBHOOK_BATCH_SIZE, max_batches: int = WEBHOOK_MAX_BATCHES):
+    """
+    Periodic task (Celery Beat) that applies stored Razorpay webhook events
+
+    Each batch is claimed with SKIP LOCKED, so several workers can run this
+    at once. Payment updates and rollups are committed together with the
+    events' new status; then stats caches are invalidated and confirmations
+    are sent through send_whatsapp_batch_task.
+    """
+    processed = 0
+    for _ in range(max_batches):
+        db = SessionLocal()
+        try:
+            events = claim_webhook_events(db, batch_size)
+            if not events:
+                break
+            owner_ids, confirmations = process_webhook_batch(db, events)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for owner_id in owner_ids:
+            invalidate_sync(PAYMENT_STATS_CACHE, owner_id)
+        for i in range(0, len(confirmations), SEND_BATCH_SIZE):
+            send_whatsapp_batch_task.delay(confirmations[i:i + SEND_BATCH_SIZE])
+        processed += len(events)
+        if len(events) < batch_size:
+            break
+    return {"processed": processed}
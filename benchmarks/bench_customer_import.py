@@ -0,0 +1,113 @@
+"""
+Customer Import Benchmark Script
+Generates a synthetic customers CSV and times the streaming COPY importer
+against the previous row-by-row import, in a scratch schema.
+
+Usage: python benchmarks/bench_customer_import.py [--rows 1000000] [--legacy-rows 20000]
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models import Customer, User
+from app.services.customer_import import import_customers_csv
+
+BENCH_SCHEMA = "greentick_bench"
+
+
+def write_csv(path: str, rows: int):
+    """Write a CSV where 1% of rows are duplicates and 0.1% lack a phone"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "phone", "notes"])
+        for i in range(rows):
+            phone = "" if i % 1000 == 999 else f"+91{9000000000 + (i - 1 if i % 100 == 99 else i)}"
+            writer.writerow([f"Customer {i}", phone, f"Imported row {i}"])
+
+
+def legacy_import(db: Session, owner_id: int, path: str) -> int:
+    """The previous implementation: whole file in memory, one SELECT per row, ORM adds"""
+    with open(path, "rb") as f:
+        contents = f.read()
+    success_count = 0
+    for row in csv.DictReader(io.StringIO(contents.decode("utf-8"))):
+        if not row.get("name") or not row.get("phone"):
+            continue
+        existing = db.scalar(select(Customer).where(Customer.phone == row["phone"], Customer.owner_id == owner_id))
+        if existing:
+            continue
+        db.add(Customer(name=row["name"], phone=row["phone"], notes=row.get("notes"), owner_id=owner_id))
+        success_count += 1
+    db.commit()
+    return success_count
+
+
+def timed(label: str, rows: int, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s), "
+          f"peak Python memory {peak / 1024 / 1024:.1f} MiB -> {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000,
+                        help="rows for the row-by-row baseline (0 to skip)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        connection.commit()
+
+        try:
+            db = Session(bind=connection)
+            owners = [User(email="legacy@bench.test"), User(email="copy@bench.test")]
+            db.add_all(owners)
+            db.commit()
+
+            if args.legacy_rows:
+                path = os.path.join(tmp, "legacy.csv")
+                write_csv(path, args.legacy_rows)
+                timed("row-by-row import", args.legacy_rows, lambda: legacy_import(db, owners[0].id, path))
+
+            path = os.path.join(tmp, "customers.csv")
+            write_csv(path, args.rows)
+
+            def run():
+                with open(path, "rb") as f:
+                    result = import_customers_csv(db, owners[1].id, f)
+                db.commit()
+                return {k: v for k, v in result.items() if k != "failed_rows"}
+
+            timed("streaming COPY import", args.rows, run)
+            db.close()
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
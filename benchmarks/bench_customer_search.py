@@ -0,0 +1,93 @@
+"""
+Customer Search Benchmark Script
+Seeds one tenant with a large number of customers in a scratch schema and
+times the previous three-way ILIKE search against the trigram / phone-prefix
+search used by GET /customers/?search=, with and without relevance ranking.
+
+Usage: python benchmarks/bench_customer_search.py [--rows 1000000] [--repeats 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+
+from app.database import Base, engine
+from app.models import Customer
+from app.services.customer_search import customer_search_rank, search_customers
+
+BENCH_SCHEMA = "greentick_bench"
+OWNER_ID = 1
+SEARCHES = ["Customer 4242", "98765", "+91 90000 12", "vip"]
+
+
+def seed(connection, rows: int):
+    print(f"Seeding {rows} customers for one tenant...")
+    connection.execute(text("""
+        INSERT INTO users (id, email, hashed_password, is_active) VALUES (:owner_id, 'search@bench.test', 'x', true)
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO customers (name, phone, notes, owner_id, created_at)
+        SELECT 'Customer ' || g, '+91 ' || (9000000000 + g * 7919 % 999999999),
+               CASE WHEN g % 50 = 0 THEN 'vip account' END, :owner_id, now()
+        FROM generate_series(1, :n) g
+    """), {"n": rows, "owner_id": OWNER_ID})
+    connection.execute(text("ANALYZE"))
+
+
+def legacy_query(search: str):
+    search_term = f"%{search}%"
+    return select(Customer.id).where(Customer.owner_id == OWNER_ID).where(
+        (Customer.name.ilike(search_term)) |
+        (Customer.phone.ilike(search_term)) |
+        (Customer.notes.ilike(search_term))
+    ).limit(20)
+
+
+def median_ms(connection, query, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        connection.execute(query).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        seed(connection, args.rows)
+        connection.commit()
+
+        try:
+            base = select(Customer.id).where(Customer.owner_id == OWNER_ID)
+            for search in SEARCHES:
+                searched = search_customers(base, search)
+                ranked = searched.order_by(customer_search_rank(search).desc(), Customer.id)
+                print(f"\nsearch {search!r}")
+                print(f"  ILIKE (previous)   {median_ms(connection, legacy_query(search), args.repeats):8.2f} ms")
+                print(f"  indexed            {median_ms(connection, searched.limit(20), args.repeats):8.2f} ms")
+                print(f"  indexed, ranked    {median_ms(connection, ranked.limit(20), args.repeats):8.2f} ms")
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
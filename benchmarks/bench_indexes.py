@@ -0,0 +1,148 @@
+"""
+Index Benchmark Script
+Seeds a scratch schema with a million-row dataset and compares the EXPLAIN
+plans and latency of the hot queries with only the primary-key and unique
+indexes, and with every index of the models (the hot query indexes of
+revision 3f9a1c2d7b4e and the ones added since).
+
+Usage: python benchmarks/bench_indexes.py [--rows 1000000] [--keep]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.database import Base, engine
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
+BENCH_SCHEMA = "greentick_bench"
+
+# Queries mirroring the routes and tasks the indexes were designed for
+QUERIES = {
+    "dispatch due scan (claim_due_reminders)": """
+        SELECT r.id FROM reminders r JOIN customers c ON c.id = r.customer_id
+        WHERE r.status = 'pending' AND r.send_time <= now()
+        ORDER BY r.send_time LIMIT 500
+    """,
+    "read_reminders": """
+        SELECT r.* FROM reminders r JOIN customers c ON c.id = r.customer_id
+        WHERE c.owner_id = :owner_id ORDER BY r.send_time LIMIT 100
+    """,
+    "read_payments": """
+        SELECT * FROM payments WHERE owner_id = :owner_id
+        ORDER BY created_at DESC LIMIT 100
+    """,
+    # load_payment_stats for the last 30 days: whole days from the rollups,
+    # the partial first day from payments
+    "get_payment_stats (last 30 days, rollups)": """
+        SELECT sum(payment_count), sum(amount) FROM payment_daily_rollups
+        WHERE owner_id = :owner_id AND day >= current_date - 29
+    """,
+    "get_payment_stats (last 30 days, partial day)": """
+        SELECT count(*), sum(amount) FROM payments
+        WHERE owner_id = :owner_id AND created_at >= now() - interval '30 days'
+          AND created_at < current_date - 29
+    """,
+    "bulk import dedupe check": """
+        SELECT id FROM customers WHERE owner_id = :owner_id AND phone = :phone LIMIT 1
+    """,
+}
+
+
+def seed(connection, rows: int):
+    users = max(rows // 1000, 10)
+    customers = max(rows // 5, 100)
+    print(f"Seeding {users} users, {customers} customers, {rows} reminders, {rows} payments...")
+    connection.execute(text("""
+        INSERT INTO users (id, email, hashed_password, is_active)
+        SELECT g, 'user' || g || '@bench.test', 'x', true FROM generate_series(1, :n) g
+    """), {"n": users})
+    connection.execute(text("""
+        INSERT INTO customers (id, name, phone, owner_id, created_at)
+        SELECT g, 'Customer ' || g, '+91' || (9000000000 + g), 1 + g % :users,
+               now() - (g % 365) * interval '1 day'
+        FROM generate_series(1, :n) g
+    """), {"n": customers, "users": users})
+    connection.execute(text("""
+        INSERT INTO reminders (id, message, send_time, customer_id, status, frequency, created_at)
+        SELECT g, 'Reminder ' || g, now() + ((g % 20000) - 1000) * interval '1 minute',
+               1 + g % :customers, CASE WHEN g % 10 = 0 THEN 'pending' ELSE 'sent' END,
+               'one_time', now()
+        FROM generate_series(1, :n) g
+    """), {"n": rows, "customers": customers})
+    connection.execute(text("""
+        INSERT INTO payments (id, amount, description, status, customer_id, owner_id, created_at)
+        SELECT g, (g % 5000) + 0.5, 'Payment ' || g,
+               (ARRAY['pending', 'completed', 'failed'])[1 + g % 3],
+               1 + g % :customers, 1 + g % :users, now() - (g % 730) * interval '1 day'
+        FROM generate_series(1, :n) g
+    """), {"n": rows, "customers": customers, "users": users})
+    connection.execute(text("""
+        INSERT INTO payment_daily_rollups (owner_id, day, status, payment_count, amount)
+        SELECT owner_id, created_at::date, status, count(*), sum(amount)
+        FROM payments GROUP BY owner_id, created_at::date, status
+    """))
+    connection.execute(text("ANALYZE"))
+
+
+def measure(connection, params: dict, repeats: int):
+    for name, sql in QUERIES.items():
+        plan = connection.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql), params).scalars().all()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            connection.execute(text(sql), params).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"\n--- {name}: median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms")
+        for line in plan:
+            print("    " + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    params = {"owner_id": 7, "phone": "+919000000007"}
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        # Unique indexes stay: they enforce constraints rather than serve queries
+        secondary_indexes = [
+            index for table in Base.metadata.sorted_tables for index in table.indexes if not index.unique
+        ]
+        for index in secondary_indexes:
+            index.drop(connection)
+        seed(connection, args.rows)
+        connection.commit()
+
+        print("\n" + "=" * 60 + "\nBEFORE (primary-key and unique indexes only)\n" + "=" * 60)
+        measure(connection, params, args.repeats)
+
+        for index in secondary_indexes:
+            index.create(connection)
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+
+        print("\n" + "=" * 60 + "\nAFTER (all model indexes)\n" + "=" * 60)
+        measure(connection, params, args.repeats)
+
+        if not args.keep:
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
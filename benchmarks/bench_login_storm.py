@@ -0,0 +1,102 @@
+"""
+Login Storm Load Test
+Measures the latency of a cheap authenticated endpoint (GET /customers/?limit=1)
+on its own and while many clients log in at once, against a running API
+server. Before bcrypt moved to the password hashing pool, every login
+blocked the event loop for the length of a hash, so the endpoint's p99
+grew with the storm; it should now stay close to the quiet baseline.
+
+Start the API first (single worker makes the effect easiest to see):
+    uvicorn app.main:app --workers 1
+
+Usage: python benchmarks/bench_login_storm.py [--url http://localhost:8000] [--logins 200] [--concurrency 50] [--probes 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import aiohttp
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label: str, timings):
+    print(f"{label:<22} n={len(timings):<5} p50 {statistics.median(timings):8.2f} ms"
+          f"   p99 {percentile(timings, 99):8.2f} ms   max {max(timings):8.2f} ms")
+
+
+async def create_user(session: aiohttp.ClientSession, url: str):
+    email = f"storm-{uuid.uuid4().hex[:12]}@bench.test"
+    password = "storm-password"
+    async with session.post(f"{url}/auth/signup", json={"email": email, "password": password}) as response:
+        response.raise_for_status()
+        token = (await response.json())["access_token"]
+    return email, password, token
+
+
+async def probe(session: aiohttp.ClientSession, url: str, token: str, count: int, interval: float):
+    """Time `count` requests to the cheap endpoint, one every `interval` seconds"""
+    timings = []
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(count):
+        start = time.perf_counter()
+        async with session.get(f"{url}/customers/?limit=1", headers=headers) as response:
+            await response.read()
+        timings.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return timings
+
+
+async def login_storm(session: aiohttp.ClientSession, url: str, email: str, password: str,
+                      logins: int, concurrency: int):
+    """Run `logins` logins, `concurrency` at a time; returns (status counts, login latencies)"""
+    statuses = {}
+    timings = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            async with session.post(f"{url}/auth/token", data={"username": email, "password": password}) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            timings.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses, timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between probe requests")
+    args = parser.parse_args()
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 10)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        email, password, token = await create_user(session, args.url)
+
+        quiet = await probe(session, args.url, token, args.probes, args.interval)
+        report("probe, quiet", quiet)
+
+        storm_task = asyncio.create_task(
+            login_storm(session, args.url, email, password, args.logins, args.concurrency)
+        )
+        during = await probe(session, args.url, token, args.probes, args.interval)
+        statuses, login_timings = await storm_task
+        report("probe, login storm", during)
+        report("login", login_timings)
+        print(f"login responses by status: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
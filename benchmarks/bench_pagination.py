@@ -0,0 +1,106 @@
+"""
+Pagination Benchmark Script
+Seeds one tenant with a large number of payments in a scratch schema and
+times fetching pages at increasing depth with OFFSET/LIMIT and with the
+keyset cursors used by the listing endpoints.
+
+Usage: python benchmarks/bench_pagination.py [--rows 1000000] [--page-size 100] [--repeats 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Response
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models import Payment
+from app.pagination import NEXT_CURSOR_HEADER
+from app.routes.payments import PAYMENTS_KEYSET
+
+BENCH_SCHEMA = "greentick_bench"
+OWNER_ID = 1
+
+
+def seed(connection, rows: int):
+    print(f"Seeding {rows} payments for one tenant...")
+    connection.execute(text("""
+        INSERT INTO users (id, email, hashed_password, is_active) VALUES (:owner_id, 'pages@bench.test', 'x', true)
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO customers (id, name, phone, owner_id, created_at)
+        VALUES (1, 'Customer 1', '+919000000001', :owner_id, now())
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO payments (amount, description, status, customer_id, owner_id, created_at, updated_at)
+        SELECT (g % 5000) + 0.5, 'Payment ' || g, 'completed', 1, :owner_id,
+               now() - (g / 10) * interval '1 second', now()
+        FROM generate_series(1, :n) g
+    """), {"n": rows, "owner_id": OWNER_ID})
+    connection.execute(text("ANALYZE"))
+
+
+def median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    base = select(Payment).where(Payment.owner_id == OWNER_ID)
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        seed(connection, args.rows)
+        connection.commit()
+
+        try:
+            db = Session(bind=connection)
+            depth = args.page_size
+            while depth < args.rows:
+                skip = depth - args.page_size
+                # The cursor a client would hold after reading the previous page
+                cursor = None
+                if skip:
+                    previous = db.scalars(PAYMENTS_KEYSET.apply(base, None, 0, skip - 1)).first()
+                    response = Response()
+                    PAYMENTS_KEYSET.page([previous, previous], 1, response)
+                    cursor = response.headers[NEXT_CURSOR_HEADER]
+
+                offset_ms = median_ms(
+                    lambda: db.scalars(PAYMENTS_KEYSET.apply(base, None, args.page_size, skip)).all(), args.repeats
+                )
+                keyset_ms = median_ms(
+                    lambda: db.scalars(PAYMENTS_KEYSET.apply(base, cursor, args.page_size)).all(), args.repeats
+                )
+                print(f"rows {skip:>9}-{depth:<9} OFFSET {offset_ms:8.2f} ms   keyset {keyset_ms:6.2f} ms")
+                db.expunge_all()
+                depth *= 10
+            db.close()
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Payment Stats Benchmark Script
+Seeds one tenant with a large number of payments in a scratch schema and
+compares the previous load-everything-and-sum-in-Python stats with the
+grouped SQL aggregate, the bucketed series, and the payment_daily_rollups
+reads behind /payments/stats/summary.
+
+Usage: python benchmarks/bench_payment_stats.py [--rows 500000] [--repeats 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models import Payment, PaymentStatus
+from app.services.payment_stats import (
+    STAT_FIELDS, payment_series_query, payment_stats_query, rollup_series_query, rollup_stats_query,
+    summarize_totals
+)
+
+BENCH_SCHEMA = "greentick_bench"
+OWNER_ID = 1
+
+
+def seed(connection, rows: int):
+    print(f"Seeding {rows} payments for one tenant...")
+    connection.execute(text("""
+        INSERT INTO users (id, email, hashed_password, is_active) VALUES (:owner_id, 'stats@bench.test', 'x', true)
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO customers (id, name, phone, owner_id, created_at)
+        SELECT g, 'Customer ' || g, '+91' || (9000000000 + g), :owner_id, now()
+        FROM generate_series(1, 1000) g
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO payments (amount, description, status, customer_id, owner_id, created_at, updated_at)
+        SELECT (g % 5000) + 0.5, 'Payment ' || g,
+               (ARRAY['pending', 'completed', 'failed'])[1 + g % 3],
+               1 + g % 1000, :owner_id, now() - (g % 730) * interval '1 day', now()
+        FROM generate_series(1, :n) g
+    """), {"n": rows, "owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO payment_daily_rollups (owner_id, day, status, payment_count, amount)
+        SELECT owner_id, created_at::date, status, count(*), sum(amount)
+        FROM payments GROUP BY owner_id, created_at::date, status
+    """))
+    connection.execute(text("ANALYZE"))
+
+
+def legacy_stats(db: Session):
+    """The previous implementation: every Payment loaded as an ORM object"""
+    payments = db.scalars(select(Payment).where(Payment.owner_id == OWNER_ID)).all()
+    total_payments = len(payments)
+    completed_payments = sum(1 for payment in payments if payment.status == PaymentStatus.COMPLETED.value)
+    result = {
+        "total_payments": total_payments,
+        "total_amount": sum(payment.amount for payment in payments),
+        "completed_payments": completed_payments,
+        "pending_payments": sum(1 for payment in payments if payment.status == PaymentStatus.PENDING.value),
+        "failed_payments": sum(1 for payment in payments if payment.status == PaymentStatus.FAILED.value),
+    }
+    db.expunge_all()
+    return result
+
+
+def summarize(row):
+    """An aggregate row as the stats payload"""
+    return summarize_totals({field: getattr(row, field) for field in STAT_FIELDS})
+
+
+def aggregate_stats(db: Session):
+    return summarize(db.execute(payment_stats_query(OWNER_ID)).one())
+
+
+def bucketed_series(db: Session, bucket: str):
+    rows = db.execute(payment_series_query(OWNER_ID, bucket))
+    return len([summarize(row) for row in rows])
+
+
+def rollup_stats(db: Session):
+    return summarize(db.execute(rollup_stats_query(OWNER_ID)).one())
+
+
+def rollup_series(db: Session, bucket: str):
+    rows = db.execute(rollup_series_query(OWNER_ID, bucket))
+    return len([summarize(row) for row in rows])
+
+
+def timed(label: str, fn, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms, "
+          f"peak Python memory {peak / 1024 / 1024:.1f} MiB -> {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        seed(connection, args.rows)
+        connection.commit()
+
+        try:
+            db = Session(bind=connection)
+            timed("python sum over ORM rows", lambda: legacy_stats(db), args.repeats)
+            timed("grouped SQL aggregate", lambda: aggregate_stats(db), args.repeats)
+            timed("daily series (buckets)", lambda: bucketed_series(db, "day"), args.repeats)
+            timed("monthly series (buckets)", lambda: bucketed_series(db, "month"), args.repeats)
+            timed("daily rollups aggregate", lambda: rollup_stats(db), args.repeats)
+            timed("daily rollups series (buckets)", lambda: rollup_series(db, "day"), args.repeats)
+            db.close()
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Template Rendering Micro-Benchmark
+Renders a campaign message for many recipients with the previous
+str.replace-per-variable apply_template and with the compiled template
+engine (single render and render_many). No database is needed.
+
+Usage: python benchmarks/bench_template_render.py [--recipients 100000] [--variables 6] [--repeats 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.template_engine import compile_template, template_cache
+
+
+def legacy_apply_template(template_content, variables):
+    """The previous implementation: one str.replace pass per variable"""
+    result = template_content
+    for var_name, var_value in variables.items():
+        result = result.replace(f"{{{var_name}}}", var_value)
+    return result
+
+
+def build_campaign(recipients: int, variables: int):
+    names = [f"var{i}" for i in range(variables)]
+    template = "Hi {name}, " + " ".join(
+        f"your {name} is {{{name}}} and" for name in names
+    ) + " thank you for choosing us! Reply STOP to opt out."
+    rows = [
+        {"name": f"Customer {r}", **{name: f"value {r}-{i}" for i, name in enumerate(names)}}
+        for r in range(recipients)
+    ]
+    return template, rows
+
+
+def timed(label: str, fn, repeats: int, recipients: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f"{label}: median {median * 1000:.1f} ms ({recipients / median:,.0f} messages/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=100_000)
+    parser.add_argument("--variables", type=int, default=6)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    template, rows = build_campaign(args.recipients, args.variables)
+    expected = [legacy_apply_template(template, row) for row in rows[:100]]
+    assert compile_template(template).render_many(rows[:100]) == expected
+
+    timed("str.replace per variable", lambda: [legacy_apply_template(template, row) for row in rows],
+          args.repeats, args.recipients)
+    timed("compiled, render per message (LRU lookup each time)",
+          lambda: [compile_template(template, "campaign", 1).render(row) for row in rows],
+          args.repeats, args.recipients)
+    timed("compiled, render_many", lambda: compile_template(template, "campaign", 1).render_many(rows),
+          args.repeats, args.recipients)
+    template_cache.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Webhook Pipeline Benchmark Script
+Generates synthetic Razorpay payment_link.paid events for pending payments in
+a scratch schema and measures:
+  - inbox ingest: one INSERT ... ON CONFLICT DO NOTHING and commit per event,
+    as done by POST /payments/webhook, including redeliveries
+  - batch processing: claim + process_webhook_batch + commit, as done by the
+    process_webhook_events task (confirmation sends are not made)
+  - the previous inline processing: one locked SELECT, update, rollup
+    upserts and commit per event (without its blocking Twilio send)
+
+Usage: python benchmarks/bench_webhooks.py [--events 20000] [--batch-size 500] [--duplicates 0.1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models import Payment, PaymentStatus, WebhookEvent, WebhookEventStatus
+from app.services.payment_rollups import rollup_entry, rollup_statements
+from app.services.webhook_inbox import claim_webhook_events, process_webhook_batch, store_webhook_event
+
+BENCH_SCHEMA = "greentick_bench"
+OWNER_ID = 1
+
+
+def seed(connection, payments: int):
+    print(f"Seeding {payments} pending payments...")
+    connection.execute(text("""
+        INSERT INTO users (id, email, hashed_password, is_active) VALUES (:owner_id, 'hooks@bench.test', 'x', true)
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO customers (id, name, phone, owner_id, created_at)
+        SELECT g, 'Customer ' || g, '+91' || (9000000000 + g), :owner_id, now()
+        FROM generate_series(1, 1000) g
+    """), {"owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO payments (id, amount, description, status, customer_id, owner_id, created_at, updated_at)
+        SELECT g, (g % 5000) + 0.5, 'Payment ' || g, 'pending', 1 + g % 1000, :owner_id,
+               now() - (g % 90) * interval '1 day', now()
+        FROM generate_series(1, :n) g
+    """), {"n": payments, "owner_id": OWNER_ID})
+    connection.execute(text("""
+        INSERT INTO payment_daily_rollups (owner_id, day, status, payment_count, amount)
+        SELECT owner_id, created_at::date, status, count(*), sum(amount)
+        FROM payments GROUP BY owner_id, created_at::date, status
+    """))
+    connection.execute(text("ANALYZE"))
+
+
+def reset_payments(connection):
+    """Back to all-pending, for the next run over the same events"""
+    connection.execute(text("UPDATE payments SET status = 'pending', razorpay_payment_id = NULL"))
+    connection.execute(text("DELETE FROM payment_daily_rollups"))
+    connection.execute(text("""
+        INSERT INTO payment_daily_rollups (owner_id, day, status, payment_count, amount)
+        SELECT owner_id, created_at::date, status, count(*), sum(amount)
+        FROM payments GROUP BY owner_id, created_at::date, status
+    """))
+    connection.commit()
+
+
+def synthetic_events(count: int, duplicates: float):
+    """(event_id, payload) pairs, one per payment, with a share redelivered"""
+    events = []
+    for payment_id in range(1, count + 1):
+        payload = {
+            "event": "payment_link.paid",
+            "payload": {
+                "payment_link": {"entity": {"id": f"plink_{payment_id}", "reference_id": str(payment_id)}},
+                "payment": {"entity": {"id": f"pay_{uuid.uuid4().hex[:14]}"}},
+            },
+        }
+        events.append((f"evt_{payment_id}", payload))
+    events += random.sample(events, int(count * duplicates))
+    random.shuffle(events)
+    return events
+
+
+def ingest(connection, events):
+    db = Session(bind=connection)
+    start = time.perf_counter()
+    for event_id, payload in events:
+        db.execute(store_webhook_event(event_id, payload))
+        db.commit()
+    elapsed = time.perf_counter() - start
+    stored = db.scalar(select(func.count()).select_from(WebhookEvent))
+    db.close()
+    return elapsed, stored
+
+
+def process_batches(connection, batch_size: int):
+    db = Session(bind=connection)
+    processed = confirmations = 0
+    start = time.perf_counter()
+    while True:
+        events = claim_webhook_events(db, batch_size)
+        if not events:
+            break
+        _, sends = process_webhook_batch(db, events)
+        db.commit()
+        processed += len(events)
+        confirmations += len(sends)
+        db.expunge_all()
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed, processed, confirmations
+
+
+def legacy_inline(connection, events):
+    """The previous endpoint body, one event at a time"""
+    db = Session(bind=connection)
+    start = time.perf_counter()
+    for _, payload in events:
+        reference_id = payload["payload"]["payment_link"]["entity"]["reference_id"]
+        payment = db.scalar(select(Payment).where(Payment.id == int(reference_id)).with_for_update())
+        if payment:
+            before = rollup_entry(payment)
+            payment.status = PaymentStatus.COMPLETED.value
+            payment.razorpay_payment_id = payload["payload"]["payment"]["entity"]["id"]
+            for statement in rollup_statements(before, rollup_entry(payment)):
+                db.execute(statement)
+            db.commit()
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of events delivered twice")
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events, args.duplicates)
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        # pg_trgm (customer search indexes) lives in public
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"SET search_path TO {BENCH_SCHEMA}, public"))
+        Base.metadata.create_all(connection)
+        seed(connection, args.events)
+        connection.commit()
+
+        try:
+            elapsed, stored = ingest(connection, events)
+            print(f"ingest     {len(events)} deliveries -> {stored} events in {elapsed:.2f} s "
+                  f"({len(events) / elapsed:,.0f} deliveries/s, {elapsed / len(events) * 1000:.2f} ms each)")
+
+            elapsed, processed, confirmations = process_batches(connection, args.batch_size)
+            print(f"batches    {processed} events, {confirmations} confirmations in {elapsed:.2f} s "
+                  f"({processed / elapsed:,.0f} events/s)")
+            pending = connection.scalar(
+                select(func.count()).select_from(WebhookEvent)
+                .where(WebhookEvent.status != WebhookEventStatus.PROCESSED.value)
+            )
+            print(f"           events not processed: {pending}")
+
+            reset_payments(connection)
+            elapsed = legacy_inline(connection, events)
+            print(f"inline     {len(events)} deliveries in {elapsed:.2f} s "
+                  f"({len(events) / elapsed:,.0f} deliveries/s, before any Twilio send)")
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
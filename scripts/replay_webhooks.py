@@ -0,0 +1,54 @@
+"""
+Replay Razorpay Webhook Events
+Puts stored events from the webhook_events inbox back to pending so that the
+process_webhook_events task applies them again, e.g. after fixing a bug that
+made them fail. Applying an event twice has no further effect, so processed
+events can be replayed as well.
+
+Usage:
+    python scripts/replay_webhooks.py --status failed
+    python scripts/replay_webhooks.py --event-id evt_123 --event-id evt_456
+    python scripts/replay_webhooks.py --since 2026-10-01 --until 2026-10-02 --process
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.models import WebhookEventStatus
+from app.services.webhook_inbox import requeue_webhook_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--event-id", action="append", dest="event_ids", help="event id to replay (repeatable)")
+    parser.add_argument("--status", choices=[s.value for s in WebhookEventStatus if s != WebhookEventStatus.PENDING],
+                        help="only replay events with this status")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="received at or after (UTC)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="received before (UTC)")
+    parser.add_argument("--process", action="store_true",
+                        help="apply the events now in this process instead of waiting for the Celery task")
+    args = parser.parse_args()
+
+    if not (args.event_ids or args.status or args.since or args.until):
+        parser.error("select events with --event-id, --status, --since or --until")
+
+    db = SessionLocal()
+    try:
+        count = requeue_webhook_events(db, args.event_ids, args.status, args.since, args.until)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Requeued {count} webhook events")
+
+    if args.process and count:
+        from app.tasks import process_webhook_events
+        print(process_webhook_events())
+
+
+if __name__ == "__main__":
+    main()
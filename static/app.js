@@ -649,6 +649,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         
                         const response = await fetch(`${API_URL}/reminders/preview-template`, {
                             method: 'POST',
+                            headers: { 'Authorization': `Bearer ${authToken}` },
                             body: formData
                         });
                         
@@ -12,17 +12,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import database modules at the top level
 from sqlalchemy import create_engine, text, inspect as sqlalchemy_inspect
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.database import DATABASE_URL
+
 def test_database_connection():
     try:
         print("🔍 Testing Database Connection...")
         print("=" * 50)
 
-        # Database configuration (same as in app/database.py)
-        DATABASE_URL = "postgresql+psycopg2://saquibn:@localhost/greentick"
-
-        print(f"📋 Database URL: {DATABASE_URL.replace('saquibn:@', 'saquibn:***@')}")
+        print(f"📋 Database URL: {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
 
         # Create engine
         print("🔧 Creating database engine...")
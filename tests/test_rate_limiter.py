@@ -0,0 +1,108 @@
+import time
+import uuid
+
+import fakeredis
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import Bucket, TokenBucketLimiter
+
+RATE = 20.0  # tokens per second, so one token every 50 ms
+CAPACITY = 5
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays the limiter waited for (really slept, so Redis time moves on too)"""
+    recorded = []
+    real_sleep = time.sleep
+
+    def sleep(seconds):
+        if seconds:
+            recorded.append(seconds)
+        real_sleep(seconds)
+
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleep)
+    return recorded
+
+
+def make_limiter(max_queue_seconds: float = 30.0, client=None) -> TokenBucketLimiter:
+    bucket = Bucket(f"ratelimit:test:{uuid.uuid4().hex}", RATE, CAPACITY)
+    return TokenBucketLimiter(client or fakeredis.FakeRedis(), [bucket], max_queue_seconds)
+
+
+def reserve(limiter: TokenBucketLimiter) -> int:
+    """One run of the bucket script: ms to wait (>= 0) or minus ms to retry after"""
+    keys, args = limiter._script_args(1)
+    return int(limiter._script(keys=keys, args=args))
+
+
+def test_burst_up_to_capacity_goes_out_without_waiting(sleeps):
+    limiter = make_limiter()
+
+    waited = [limiter.acquire() for _ in range(CAPACITY)]
+
+    assert waited == [0.0] * CAPACITY
+    assert sleeps == []
+
+
+def test_after_the_burst_sends_are_paced_at_the_rate(sleeps):
+    limiter = make_limiter()
+    for _ in range(CAPACITY):
+        limiter.acquire()
+
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+
+    assert len(sleeps) == 10
+    assert all(0.03 <= delay <= 0.1 for delay in sleeps)
+    assert 10 / RATE * 0.8 <= elapsed <= 10 / RATE * 2
+
+
+def test_reservations_beyond_the_queue_limit_are_rejected():
+    # Debt may reach RATE * 0.25 s = 5 tokens: five callers queue, the sixth is turned away
+    limiter = make_limiter(max_queue_seconds=0.25)
+    for _ in range(CAPACITY):
+        assert reserve(limiter) == 0
+
+    queued = [reserve(limiter) for _ in range(5)]
+    rejected = reserve(limiter)
+
+    assert queued == sorted(queued)
+    assert 0 < queued[0] <= 60 and 200 <= queued[-1] <= 250
+    assert rejected < 0
+
+
+def test_rejected_caller_retries_until_it_gets_a_slot(sleeps):
+    limiter = make_limiter(max_queue_seconds=0.1)
+    for _ in range(CAPACITY + 2):
+        reserve(limiter)
+
+    limiter.acquire()
+
+    # One wait for the queue to drain, one for its own reservation
+    assert len(sleeps) == 2
+
+
+def test_all_buckets_are_charged_together():
+    client = fakeredis.FakeRedis()
+    narrow = Bucket(f"ratelimit:test:{uuid.uuid4().hex}", RATE, 2)
+    wide = Bucket(f"ratelimit:test:{uuid.uuid4().hex}", RATE, 10)
+    limiter = TokenBucketLimiter(client, [narrow, wide])
+
+    results = [reserve(limiter) for _ in range(3)]
+
+    assert results[:2] == [0, 0] and results[2] > 0
+    # Three tokens taken from the wide bucket too, give or take the refill while the test runs
+    assert 7 <= float(client.hget(wide.key, "tokens")) < 7.5
+
+
+def test_fails_open_when_redis_is_unavailable(sleeps):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    limiter = make_limiter(client=fakeredis.FakeRedis(server=server))
+
+    assert limiter.acquire() == 0.0
+    assert sleeps == []
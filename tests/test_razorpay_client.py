@@ -0,0 +1,155 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from app.services import razorpay_client
+from app.services.razorpay_client import CircuitBreaker, RazorpayClient
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(razorpay_client, "backoff_delay", lambda attempt: 0)
+
+
+class MockRazorpay:
+    """Local stand-in for the payment links API answering with a scripted list of statuses"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+        self.peers = set()
+
+    async def create(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == "timeout":
+            await asyncio.sleep(1)
+            status = 200
+        if status < 400:
+            return web.json_response({"id": "plink_1", "short_url": "https://rzp.io/i/x"}, status=status)
+        return web.json_response(
+            {"error": {"code": "BAD_REQUEST_ERROR", "description": f"failed with {status}", "field": "amount"}},
+            status=status
+        )
+
+
+@asynccontextmanager
+async def running(mock: MockRazorpay, **options):
+    app = web.Application()
+    app.router.add_post("/v1/payment_links", mock.create)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    client = RazorpayClient("key", "secret", base_url=f"http://127.0.0.1:{port}", **options)
+    try:
+        yield client
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_server_errors_are_retried_until_success():
+    async def scenario():
+        mock = MockRazorpay([503, 502])
+        async with running(mock, max_retries=2) as client:
+            result = await client.create_payment_link({"amount": 100})
+        return mock, result, client
+
+    mock, result, client = asyncio.run(scenario())
+
+    assert result["id"] == "plink_1"
+    assert mock.requests == 3
+    assert client.breaker.state == "closed"
+
+
+def test_timeouts_are_retried():
+    async def scenario():
+        mock = MockRazorpay(["timeout"])
+        async with running(mock, max_retries=1, timeout=0.2) as client:
+            return mock, await client.create_payment_link({"amount": 100})
+
+    mock, result = asyncio.run(scenario())
+
+    assert result["id"] == "plink_1"
+    assert mock.requests == 2
+
+
+def test_client_errors_are_returned_without_retrying():
+    async def scenario():
+        mock = MockRazorpay([400])
+        async with running(mock, max_retries=2) as client:
+            return mock, await client.create_payment_link({"amount": -1}), client
+
+    mock, result, client = asyncio.run(scenario())
+
+    assert result == {"error": "failed with 400", "status_code": 400, "field": "amount"}
+    assert mock.requests == 1
+    assert client.breaker.failures == 0
+
+
+def test_retries_give_up_with_the_last_error():
+    async def scenario():
+        mock = MockRazorpay([500, 500, 500])
+        async with running(mock, max_retries=2) as client:
+            return mock, await client.create_payment_link({"amount": 100})
+
+    mock, result = asyncio.run(scenario())
+
+    assert result == {"error": "HTTP 500", "status_code": 500}
+    assert mock.requests == 3
+
+
+def test_circuit_opens_fails_fast_and_recovers_after_a_trial_call():
+    async def scenario():
+        mock = MockRazorpay([500, 500, 500])
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+        async with running(mock, max_retries=0, breaker=breaker) as client:
+            for _ in range(3):
+                await client.create_payment_link({"amount": 100})
+            assert breaker.state == "open"
+
+            fast = await client.create_payment_link({"amount": 100})
+            assert fast == {"error": "Razorpay is unavailable (circuit open)", "status_code": 503}
+            assert mock.requests == 3
+
+            await asyncio.sleep(0.25)
+            assert breaker.state == "half_open"
+            recovered = await client.create_payment_link({"amount": 100})
+        return mock, breaker, recovered
+
+    mock, breaker, recovered = asyncio.run(scenario())
+
+    assert recovered["id"] == "plink_1"
+    assert mock.requests == 4
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_call_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_connections_are_kept_alive_between_calls():
+    async def scenario():
+        mock = MockRazorpay([])
+        async with running(mock) as client:
+            for _ in range(5):
+                await client.create_payment_link({"amount": 100})
+        return mock
+
+    mock = asyncio.run(scenario())
+
+    assert mock.requests == 5
+    assert len(mock.peers) == 1